@@ -8,8 +8,6 @@ import sys
 import datetime
 
 import numpy as np
-from scipy import stats
-from scipy.stats import linregress
 
 import pandas as pd
 from pandas.tseries.offsets import DateOffset
@@ -75,11 +73,197 @@ def bias(observed, modelled):
     residuals = observed - modelled      
     return np.mean(residuals)
 
+
+class GoodnessOfFit(object):
+    '''
+    streaming accumulator of goodness-of-fit statistics for many series
+
+    The observed and modelled values are summarised per column (station or
+    model run) as the number of pairs, the means, the (co)variance sums
+    and the sum of the absolute residuals. Pairs with a missing value are
+    skipped. Accumulators of different chunks of the same series can be
+    merged, so series that do not fit in memory can be scored chunk by
+    chunk.
+
+    Parameters
+    -----------
+    columns : list or pd.Index
+        labels of the columns (stations or model runs)
+
+    Examples
+    ---------
+    >>> fit = GoodnessOfFit.from_data(data["L06_347"], data["LS06_347"])
+    >>> fit.metrics()
+
+    >>> fit = GoodnessOfFit(columns)
+    >>> for chunk in pd.read_csv(filename, chunksize=100000):
+    ...     fit.update(chunk[observed_columns], chunk[modelled_columns])
+    '''
+    FIELDS = ['n', 'mean_obs', 'mean_mod', 'ss_obs', 'ss_mod', 'sp_obs_mod',
+              'sum_abs_residuals']
+
+    def __init__(self, columns):
+        self.columns = pd.Index(columns)
+        for field in self.FIELDS:
+            setattr(self, field, np.zeros(len(self.columns)))
+
+    @staticmethod
+    def _as_2d(observed, modelled):
+        columns = getattr(modelled, 'columns', getattr(observed, 'columns',
+                                                       None))
+        obs = np.asarray(observed, dtype=float)
+        mod = np.asarray(modelled, dtype=float)
+        obs = obs.reshape(len(obs), -1)
+        mod = mod.reshape(len(mod), -1)
+        # a single observed series is compared with every modelled column
+        obs, mod = np.broadcast_arrays(obs, mod)
+        if columns is None:
+            columns = pd.RangeIndex(obs.shape[1])
+        return obs, mod, columns
+
+    @classmethod
+    def from_data(cls, observed, modelled):
+        '''
+        accumulate the statistics of observed and modelled values
+
+        Parameters
+        -----------
+        observed : np.ndarray, pd.Series or pd.DataFrame
+            observed/measured values, 1D or one column per series
+        modelled : np.ndarray, pd.Series or pd.DataFrame
+            simulated values, with the same shape as observed or one
+            column per model run for a single observed series
+        '''
+        obs, mod, columns = cls._as_2d(observed, modelled)
+        fit = cls(columns)
+        fit._accumulate(obs, mod)
+        return fit
+
+    def update(self, observed, modelled):
+        '''
+        add a chunk of observed and modelled values (see from_data)
+        '''
+        obs, mod, _ = self._as_2d(observed, modelled)
+        self._accumulate(obs, mod)
+        return self
+
+    def _accumulate(self, obs, mod):
+        valid = ~(np.isnan(obs) | np.isnan(mod))
+        obs = np.where(valid, obs, 0.)
+        mod = np.where(valid, mod, 0.)
+
+        chunk = GoodnessOfFit(self.columns)
+        chunk.n = valid.sum(axis=0).astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chunk.mean_obs = np.where(chunk.n > 0, obs.sum(axis=0) / chunk.n, 0.)
+            chunk.mean_mod = np.where(chunk.n > 0, mod.sum(axis=0) / chunk.n, 0.)
+        dev_obs = np.where(valid, obs - chunk.mean_obs, 0.)
+        dev_mod = np.where(valid, mod - chunk.mean_mod, 0.)
+        chunk.ss_obs = (dev_obs**2).sum(axis=0)
+        chunk.ss_mod = (dev_mod**2).sum(axis=0)
+        chunk.sp_obs_mod = (dev_obs * dev_mod).sum(axis=0)
+        chunk.sum_abs_residuals = np.abs(obs - mod).sum(axis=0)
+
+        merged = self.merge(chunk)
+        for field in self.FIELDS:
+            setattr(self, field, getattr(merged, field))
+
+    def merge(self, other):
+        '''
+        combine the statistics of two chunks of the same series
+
+        Parameters
+        -----------
+        other : GoodnessOfFit
+            accumulator with the same columns
+
+        Returns
+        --------
+        GoodnessOfFit
+        '''
+        merged = GoodnessOfFit(self.columns)
+        n = self.n + other.n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(n > 0, other.n / n, 0.)
+            cross = np.where(n > 0, self.n * other.n / n, 0.)
+        delta_obs = other.mean_obs - self.mean_obs
+        delta_mod = other.mean_mod - self.mean_mod
+        merged.n = n
+        merged.mean_obs = self.mean_obs + delta_obs * weight
+        merged.mean_mod = self.mean_mod + delta_mod * weight
+        merged.ss_obs = self.ss_obs + other.ss_obs + delta_obs**2 * cross
+        merged.ss_mod = self.ss_mod + other.ss_mod + delta_mod**2 * cross
+        merged.sp_obs_mod = (self.sp_obs_mod + other.sp_obs_mod
+                             + delta_obs * delta_mod * cross)
+        merged.sum_abs_residuals = (self.sum_abs_residuals
+                                    + other.sum_abs_residuals)
+        return merged
+
+    def metrics(self):
+        '''
+        goodness-of-fit metrics per column
+
+        Returns
+        --------
+        pd.DataFrame with per column (as index) the number of pairs n and
+        rmse, bias (mean of obs-mod), mae, correlation, slope and intercept
+        of the regression of modelled on observed, nse (Nash-Sutcliffe
+        efficiency) and kge (Kling-Gupta efficiency)
+        '''
+        n = np.where(self.n > 0, self.n, np.nan)
+        bias = self.mean_obs - self.mean_mod
+        # mean squared residual from the (co)variances and the bias
+        mse = (self.ss_obs + self.ss_mod - 2 * self.sp_obs_mod) / n + bias**2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = self.sp_obs_mod / np.sqrt(self.ss_obs * self.ss_mod)
+            slope = self.sp_obs_mod / self.ss_obs
+            alpha = np.sqrt(self.ss_mod / self.ss_obs)
+            beta = self.mean_mod / self.mean_obs
+            nse = 1 - mse * n / self.ss_obs
+        kge = 1 - np.sqrt((correlation - 1)**2 + (alpha - 1)**2
+                          + (beta - 1)**2)
+        return pd.DataFrame({
+            'n': self.n.astype(int),
+            'rmse': np.sqrt(np.maximum(mse, 0.)),
+            'bias': np.where(self.n > 0, bias, np.nan),
+            'mae': self.sum_abs_residuals / n,
+            'correlation': correlation,
+            'slope': slope,
+            'intercept': self.mean_mod - slope * self.mean_obs,
+            'nse': nse,
+            'kge': kge,
+            }, index=self.columns)
+
+
+def goodness_of_fit(observed, modelled):
+    '''
+    goodness-of-fit metrics of modelled against observed series
+
+    Parameters
+    -----------
+    observed : np.ndarray, pd.Series or pd.DataFrame
+        observed/measured values, 1D or one column per series
+    modelled : np.ndarray, pd.Series or pd.DataFrame
+        simulated values, with the same shape as observed or one column
+        per model run for a single observed series
+
+    Returns
+    --------
+    pd.DataFrame with the metrics per series, see GoodnessOfFit.metrics
+
+    Notes
+    -------
+    Pairs with a missing observed or modelled value are ignored.
+    '''
+    return GoodnessOfFit.from_data(observed, modelled).metrics()
+
 ##-----------------------------------------------------------------------------
 ## MODEL CALIBRATION EVALUATION PLOTS - SPREAD DIAGRAMS
 ##-----------------------------------------------------------------------------   
 
-def spread_diagram(axs, obs, mod, infobox = True, *args, **kwargs):
+def spread_diagram(axs, obs, mod, infobox = True, *args, density = 'auto',
+                   max_points = 100000, gridsize = 100, cmap = 'Blues',
+                   **kwargs):
     '''
     plot a scatter plot comparing the simulated and observed datasets in a 
     scatter plot with some extra information about the fit included.
@@ -95,16 +279,40 @@ def spread_diagram(axs, obs, mod, infobox = True, *args, **kwargs):
         1D array of the modelled output
     infobox : bool True|False
         defines if a infobox with the regression info is added or not
+    density : 'auto'|'scatter'|'hexbin'|'hist2d'
+        draw the individual points or the density of the points, 'auto'
+        switches from a scatter to a hexbin plot above max_points points
+    max_points : int
+        maximum number of points drawn as a scatter plot with 'auto'
+    gridsize : int
+        number of hexagons or bins in the x-direction of a density plot
+    cmap : str
+        colormap of a density plot
     *args, **kwargs : args
-        argument passed to the matplotlib scatter command
+        argument passed to the matplotlib scatter command (scatter only)
     
     Returns
     --------
     axs   
     '''
     p.rc('mathtext', default = 'regular')    
-       
-    axs.scatter(obs,mod, *args, **kwargs)
+
+    if density == 'auto':
+        density = 'scatter' if len(obs) <= max_points else 'hexbin'
+
+    if density == 'scatter':
+        axs.scatter(obs,mod, *args, **kwargs)
+    elif density == 'hexbin':
+        # counts per hexagon, a fixed number of patches whatever the size
+        axs.hexbin(obs, mod, gridsize = gridsize, cmap = cmap, mincnt = 1,
+                   bins = 'log')
+    elif density == 'hist2d':
+        axs.hist2d(np.asarray(obs).ravel(), np.asarray(mod).ravel(),
+                   bins = gridsize, cmap = cmap, cmin = 1,
+                   norm = mpl.colors.LogNorm())
+    else:
+        raise ValueError("density should be 'auto', 'scatter', 'hexbin' "
+                         "or 'hist2d'")
     axs.set_aspect('equal')
     
     if isinstance(obs, np.ndarray):
@@ -118,15 +326,17 @@ def spread_diagram(axs, obs, mod, infobox = True, *args, **kwargs):
     
     axs.plot([getmin, getmax], [getmin, getmax],'k--', linewidth = 0.5)
     
-    slope, intercept, r_value, p_value, std_err = stats.linregress(obs, mod)
+    fit = goodness_of_fit(obs, mod).iloc[0]
+    slope, intercept, r_value = fit['slope'], fit['intercept'], fit['correlation']
     
-    forplot = np.arange(getmin, getmax, 0.01)
+    # a straight line, two points are sufficient whatever the data range
+    forplot = np.array([getmin, getmax])
     axs.plot(forplot, slope*forplot + intercept, '-', color = 'grey', 
              linewidth = 0.5)  
     axs.set_xlim(left = getmin, right = getmax)
     axs.set_ylim(bottom = getmin, top = getmax)   
     
-    rmse = root_mean_square_error(obs, mod)
+    rmse = fit['rmse']
     
     #for infobox
     if infobox == True:
@@ -157,6 +367,42 @@ def spread_diagram(axs, obs, mod, infobox = True, *args, **kwargs):
     return axs
 
 
+def benchmark_spread_diagram(n_points = (10**4, 10**6, 10**7),
+                             max_scatter = 10**6):
+    '''
+    render time of the spread diagram for a number of points
+
+    Parameters
+    -----------
+    n_points : tuple of int
+        number of synthetic observed/modelled pairs
+    max_scatter : int
+        largest number of points to draw as scatter plot as well
+
+    Returns
+    --------
+    pd.Series with the time (s), indexed by number of points and plot type
+    '''
+    import time
+
+    rng = np.random.default_rng(0)
+    timings = {}
+    for n in n_points:
+        obs = rng.gamma(2., 10., n)
+        mod = obs * 0.9 + rng.normal(0., 5., n)
+        for density in ['scatter', 'hexbin', 'hist2d']:
+            if density == 'scatter' and n > max_scatter:
+                continue
+            fig, ax = plt.subplots(figsize=(8, 8))
+            start = time.perf_counter()
+            spread_diagram(ax, obs, mod, infobox = True, density = density,
+                           s = 5)
+            fig.canvas.draw()
+            timings[(n, density)] = time.perf_counter() - start
+            plt.close(fig)
+    return pd.Series(timings, name='time').rename_axis(['points', 'density'])
+
+
 def main(argv=None):
     print(argv[0])
     
@@ -0,0 +1,664 @@
+import argparse
+import logging
+import time
+import warnings
+from pathlib import Path
+
+import pandas as pd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from load_airbase import NS_PER_HOUR, AirbaseStore, read_airbase_folder
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExceedanceCounter:
+    """Incremental yearly count of days exceeding a rolling-mean limit
+
+    Online version of the case4 analysis::
+
+        exceedances = data.rolling(8).mean().resample('D').max() > 100
+        exceedances = exceedances.groupby(exceedances.index.year).sum()
+
+    Hourly data is appended in batches with :meth:`update`. The state kept
+    per station is independent of the length of the history: the last
+    ``window - 1`` hourly values, the maximum of the current day and one
+    counter per year.
+
+    Parameters
+    ----------
+    stations : list of str
+        Station (column) names of the hourly batches.
+    window : int, default 8
+        Number of hours of the rolling mean.
+    threshold : float, default 100.
+        Daily maximum of the rolling mean above which a day is counted.
+
+    Notes
+    -----
+    Hours missing in between two batches or within a batch are treated as
+    NaN, so the counts are equal to the pandas expression applied to the
+    regular hourly series ``data.asfreq('h')``.
+    """
+
+    def __init__(self, stations, window=8, threshold=100.):
+        self.stations = pd.Index(stations)
+        self.window = window
+        self.threshold = threshold
+
+        self._last_values = np.full((window - 1, len(self.stations)), np.nan)
+        self._last_hour = None
+        self._day = None
+        self._day_max = None
+        self._counts = {}
+
+    def _count_days(self, days, daily_max):
+        """Add finished days to the yearly counters"""
+        years = pd.DatetimeIndex(days.astype("datetime64[D]")).year.to_numpy()
+        exceeded = daily_max > self.threshold
+        for year in np.unique(years):
+            counts = self._counts.setdefault(
+                year, np.zeros(len(self.stations), dtype=np.int64))
+            counts += exceeded[years == year].sum(axis=0)
+
+    def update(self, batch):
+        """Append a batch of hourly data
+
+        Parameters
+        ----------
+        batch : DataFrame
+            Hourly values with a DatetimeIndex following the previous batch
+            and (at least) the columns of ``stations``.
+        """
+        if batch.empty:
+            return
+        if not batch.index.is_monotonic_increasing or batch.index.has_duplicates:
+            raise ValueError("The index of the batch must be sorted and unique.")
+
+        start = batch.index[0]
+        if self._last_hour is not None:
+            if start <= self._last_hour:
+                raise ValueError(f"Batch starts at {start}, before the end of "
+                                 f"the previous batch {self._last_hour}.")
+            start = self._last_hour + pd.Timedelta(hours=1)
+        hourly_index = pd.date_range(start, batch.index[-1], freq="h")
+        values = batch.reindex(index=hourly_index, columns=self.stations)
+        values = values.to_numpy(dtype=np.float64)
+
+        # rolling mean over the last hours of the previous batch and this one,
+        # NaN as soon as one of the hours of the window is missing
+        extended = np.concatenate([self._last_values, values])
+        rolling_mean = sliding_window_view(
+            extended, self.window, axis=0).sum(axis=-1) / self.window
+        self._last_values = extended[len(extended) - self.window + 1:]
+        self._last_hour = hourly_index[-1]
+
+        # daily maximum, ignoring NaN, with the open day of the previous batch
+        days = hourly_index.asi8 // (24 * NS_PER_HOUR)
+        day_starts = np.r_[0, np.flatnonzero(np.diff(days)) + 1]
+        daily_max = np.fmax.reduceat(rolling_mean, day_starts, axis=0)
+        days = days[day_starts]
+        if self._day is not None:
+            if days[0] == self._day:
+                daily_max[0] = np.fmax(daily_max[0], self._day_max)
+            else:
+                self._count_days(np.array([self._day]), self._day_max[np.newaxis])
+
+        # the last day might continue in the next batch
+        self._count_days(days[:-1], daily_max[:-1])
+        self._day, self._day_max = days[-1], daily_max[-1]
+
+    def exceedances(self):
+        """Number of exceedance days per year, including the current day
+
+        Returns
+        -------
+        DataFrame
+            Counts with the years as index and the stations as columns.
+        """
+        counts = {year: counts.copy() for year, counts in self._counts.items()}
+        if self._day is not None:
+            year = pd.Timestamp(self._day, unit="D").year
+            counts.setdefault(year, np.zeros(len(self.stations), dtype=np.int64))
+            counts[year] += self._day_max > self.threshold
+
+        result = pd.DataFrame.from_dict(counts, orient="index",
+                                        columns=self.stations).sort_index()
+        result.index.name = "year"
+        return result
+
+
+class ProfileCube:
+    """Aggregates of hourly data per station, year, month, weekday and hour
+
+    The sum, count, minimum and maximum of the hourly values are stored per
+    cell of the (station, year, month, weekday, hour) cube, so that typical
+    profiles (e.g. ``data.groupby(data.index.month).mean()``) are computed
+    by rolling up the cube instead of scanning the hourly data.
+
+    Use :meth:`from_data` to build a cube and :meth:`update` to add new
+    hours afterwards.
+
+    Examples
+    --------
+    >>> cube = ProfileCube.from_data(data)
+    >>> cube.profile("month")                  # data.groupby('month').mean()
+    >>> cube.profile(["weekend", "hour"])      # data.groupby(['weekend', 'hour']).mean()
+    >>> cube.profile("year", years=range(1999, 2013))
+    """
+
+    DIMENSIONS = ["year", "month", "weekday", "hour"]
+    STATISTICS = ["sum", "count", "min", "max"]
+
+    def __init__(self, stations, first_year, sums, counts, minima, maxima,
+                 last_timestamp=None):
+        self.stations = pd.Index(stations)
+        self.first_year = int(first_year)
+        self.sum = sums
+        self.count = counts
+        self.min = minima
+        self.max = maxima
+        self.last_timestamp = last_timestamp
+
+    @property
+    def years(self):
+        return pd.RangeIndex(self.first_year, self.first_year + self.sum.shape[1],
+                             name="year")
+
+    @classmethod
+    def from_data(cls, data):
+        """Build the cube from hourly data in a single grouped aggregation
+
+        Parameters
+        ----------
+        data : DataFrame
+            Hourly values with a DatetimeIndex and one column per station.
+        """
+        data = data.sort_index()
+        index = data.index
+        first_year = index.year.min()
+        n_years = index.year.max() - first_year + 1
+
+        cells = ((((index.year - first_year) * 12 + index.month - 1) * 7
+                  + index.dayofweek) * 24 + index.hour)
+        aggregated = data.groupby(cells.to_numpy()).agg(cls.STATISTICS)
+
+        n_cells = n_years * 12 * 7 * 24
+        shape = (len(data.columns), n_years, 12, 7, 24)
+        statistics = {}
+        for statistic in cls.STATISTICS:
+            fill_value = 0 if statistic in ["sum", "count"] else np.nan
+            values = np.full((len(data.columns), n_cells), fill_value,
+                             dtype=np.int64 if statistic == "count" else np.float64)
+            values[:, aggregated.index] = aggregated.xs(
+                statistic, axis=1, level=1)[data.columns].to_numpy().T
+            statistics[statistic] = values.reshape(shape)
+
+        return cls(data.columns, first_year, statistics["sum"],
+                   statistics["count"], statistics["min"], statistics["max"],
+                   last_timestamp=index[-1])
+
+    def update(self, data):
+        """Add new hourly data following the data already in the cube
+
+        Parameters
+        ----------
+        data : DataFrame
+            Hourly values after :attr:`last_timestamp`, with the same
+            stations as the cube.
+        """
+        if data.empty:
+            return
+        if self.last_timestamp is not None and data.index.min() <= self.last_timestamp:
+            raise ValueError("The new data overlaps with the data of the cube, "
+                             f"which ends at {self.last_timestamp}.")
+        new = ProfileCube.from_data(data[self.stations])
+
+        # align both cubes on the union of the years
+        first_year = min(self.first_year, new.first_year)
+        last_year = max(self.years[-1], new.years[-1])
+        merged = {}
+        for statistic in self.STATISTICS:
+            fill_value = 0 if statistic in ["sum", "count"] else np.nan
+            values = []
+            for cube in [self, new]:
+                cube_values = getattr(cube, statistic)
+                pad = ((0, 0), (cube.first_year - first_year,
+                                last_year - cube.years[-1]),
+                       (0, 0), (0, 0), (0, 0))
+                values.append(np.pad(cube_values, pad, constant_values=fill_value))
+            merged[statistic] = values
+
+        self.sum = merged["sum"][0] + merged["sum"][1]
+        self.count = merged["count"][0] + merged["count"][1]
+        self.min = np.fmin(*merged["min"])
+        self.max = np.fmax(*merged["max"])
+        self.first_year = first_year
+        self.last_timestamp = new.last_timestamp
+
+    def profile(self, by, statistic="mean", years=None):
+        """Typical profile of all stations by rolling up the cube
+
+        Parameters
+        ----------
+        by : str or list of str
+            Dimension(s) to group on: 'year', 'month', 'weekday', 'hour' and
+            'weekend' (True for Saturday and Sunday, as
+            ``data.index.dayofweek.isin([5, 6])`` in the case4 analysis;
+            rename the labels to get the 'weekday'/'weekend' strings of the
+            solution).
+        statistic : {'mean', 'sum', 'count', 'min', 'max'}, default 'mean'
+            Statistic of the hourly values within each group.
+        years : list of int, optional
+            Years to include, default all.
+
+        Returns
+        -------
+        DataFrame
+            Profile with the ``by`` dimensions as index and the stations as
+            columns.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        dimensions = ["weekday" if dim == "weekend" else dim for dim in by]
+        year_labels = self.years
+        select = slice(None)
+        if years is not None:
+            select = year_labels.get_indexer(list(years))
+            select = select[select >= 0]
+            year_labels = year_labels[select]
+
+        # statistics needed to calculate the requested one
+        needed = {"mean": ["sum", "count"]}.get(statistic, [statistic])
+        reductions = {"sum": np.sum, "count": np.sum,
+                      "min": np.nanmin, "max": np.nanmax}
+        rolled_up = {}
+        for name in needed:
+            values = getattr(self, name)[:, select]
+            for dim in reversed(self.DIMENSIONS):
+                if dim not in dimensions:
+                    axis = 1 + self.DIMENSIONS.index(dim)
+                    values = _reduce(values, reductions[name], axis)
+            rolled_up[name] = values
+
+        labels = {"year": year_labels, "month": pd.RangeIndex(1, 13),
+                  "weekday": pd.RangeIndex(7), "hour": pd.RangeIndex(24)}
+        kept = [dim for dim in self.DIMENSIONS if dim in dimensions]
+        index = pd.MultiIndex.from_product([labels[dim] for dim in kept],
+                                           names=kept)
+
+        frames = {}
+        for name, values in rolled_up.items():
+            frames[name] = pd.DataFrame(values.reshape(len(self.stations), -1).T,
+                                        index=index, columns=self.stations)
+
+        # order the dimensions as requested, weekend as an extra roll up
+        group_keys = [index.get_level_values(dim) for dim in dimensions]
+        if "weekend" in by:
+            is_weekend = index.get_level_values("weekday").isin([5, 6])
+            group_keys[by.index("weekend")] = pd.Index(is_weekend,
+                                                       name="weekend")
+        how = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+        for name, frame in frames.items():
+            frames[name] = frame.groupby(group_keys).agg(how[name])
+
+        if statistic == "mean":
+            return frames["sum"] / frames["count"].where(frames["count"] > 0)
+        return frames[statistic]
+
+    def save(self, path):
+        """Save the cube as a (compressed) numpy ``.npz`` file"""
+        # ISO format, an empty string when the last timestamp is not known
+        last_timestamp = ("" if self.last_timestamp is None
+                          else pd.Timestamp(self.last_timestamp).isoformat())
+        np.savez_compressed(
+            path, stations=self.stations.to_numpy(dtype=str),
+            first_year=self.first_year, last_timestamp=last_timestamp,
+            sum=self.sum, count=self.count, min=self.min, max=self.max)
+
+    @classmethod
+    def load(cls, path):
+        """Load a cube saved with :meth:`save`"""
+        with np.load(path) as cube:
+            last_timestamp = str(cube["last_timestamp"])
+            return cls(cube["stations"], cube["first_year"], cube["sum"],
+                       cube["count"], cube["min"], cube["max"],
+                       last_timestamp=(pd.Timestamp(last_timestamp)
+                                       if last_timestamp else None))
+
+
+class QuantileSketch:
+    """Mergeable approximate quantiles per window and column
+
+    Logarithmic histogram sketch (as DDSketch): each non-negative value is
+    counted in the bucket ``ceil(log(x) / log(gamma))``, zeros in a separate
+    bucket. Every quantile is returned with a relative error of at most
+    ``relative_accuracy`` compared to the exact quantile (with the linear
+    interpolation between ranks of ``Series.quantile``).
+    As the sketches are plain counts, sketches of nested windows (e.g.
+    daily into monthly) or of different stations are combined by summing
+    them, without the raw data.
+
+    Use :meth:`from_groupby` or :meth:`from_resample` to build the sketches.
+
+    Parameters
+    ----------
+    counts : ndarray
+        Counts of shape (windows, columns, buckets), bucket 0 counts zeros
+        and bucket ``b > 0`` the values with key ``min_key + b - 1``.
+    index : Index
+        Labels of the windows.
+    columns : Index
+        Labels of the columns (stations).
+    relative_accuracy : float
+        Relative accuracy of the sketch.
+    min_key : int
+        Key of bucket 1.
+
+    Examples
+    --------
+    >>> daily = QuantileSketch.from_resample(df2011[['BETN029', 'BETR801']], 'D')
+    >>> daily.rollup('W').quantile(0.95)   # ~ resample('W').quantile(0.95)
+    >>> daily.rollup('YE').combine_columns().quantile(0.95)
+    """
+
+    def __init__(self, counts, index, columns, relative_accuracy, min_key):
+        self.counts = counts
+        self.index = index
+        self.columns = pd.Index(columns)
+        self.relative_accuracy = relative_accuracy
+        self.min_key = int(min_key)
+
+    @property
+    def gamma(self):
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    @classmethod
+    def from_groupby(cls, data, by, relative_accuracy=0.01):
+        """Sketch of each group and column of ``data.groupby(by)``
+
+        Parameters
+        ----------
+        data : DataFrame or Series
+            Non-negative values, NaN values are ignored.
+        by : mapping, function, label, pd.Grouper or list of such
+            Passed to :meth:`DataFrame.groupby`.
+        relative_accuracy : float, default 0.01
+            Maximal relative error of the quantiles.
+        """
+        if isinstance(data, pd.Series):
+            data = data.to_frame()
+        grouped = data.groupby(by)
+        windows = grouped.ngroup().to_numpy()
+        index = grouped.size().index
+
+        values = data.to_numpy(dtype=np.float64)
+        if (values < 0).any():
+            raise ValueError("The quantile sketch only supports non-negative values.")
+        observed = ~np.isnan(values)
+        positive = values > 0
+
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        keys = np.zeros(values.shape, dtype=np.int64)
+        keys[positive] = np.ceil(np.log(values[positive]) / np.log(gamma))
+        min_key = keys[positive].min() if positive.any() else 0
+        max_key = keys[positive].max() if positive.any() else 0
+        n_buckets = max_key - min_key + 2
+        buckets = np.where(positive, keys - min_key + 1, 0)
+
+        n_columns = values.shape[1]
+        cells = ((windows[:, np.newaxis] * n_columns + np.arange(n_columns))
+                 * n_buckets + buckets)
+        counts = np.bincount(cells[observed & (windows[:, np.newaxis] >= 0)],
+                             minlength=len(index) * n_columns * n_buckets)
+        counts = counts.reshape(len(index), n_columns, n_buckets)
+
+        return cls(counts, index, data.columns, relative_accuracy, min_key)
+
+    @classmethod
+    def from_resample(cls, data, rule, relative_accuracy=0.01):
+        """Sketch of each resample window (e.g. 'D', 'W' or 'ME') and column"""
+        return cls.from_groupby(data, pd.Grouper(freq=rule),
+                                relative_accuracy=relative_accuracy)
+
+    def _with_counts(self, counts, index=None, columns=None):
+        return QuantileSketch(
+            counts, self.index if index is None else index,
+            self.columns if columns is None else columns,
+            self.relative_accuracy, self.min_key)
+
+    def _extend_keys(self, min_key, max_key):
+        """Counts padded to cover the keys from min_key till max_key"""
+        n_buckets = self.counts.shape[2]
+        pad = (self.min_key - min_key, max_key - (self.min_key + n_buckets - 2))
+        zeros, buckets = self.counts[..., :1], self.counts[..., 1:]
+        return np.concatenate(
+            [zeros, np.pad(buckets, ((0, 0), (0, 0), pad))], axis=-1)
+
+    def quantile(self, q):
+        """Approximate quantile of each window and column
+
+        Parameters
+        ----------
+        q : float
+            Quantile between 0 and 1.
+
+        Returns
+        -------
+        DataFrame
+            Quantiles with the windows as index and the columns, NaN for
+            windows without values.
+        """
+        cumulative = self.counts.cumsum(axis=-1)
+        total = cumulative[..., -1]
+
+        keys = self.min_key + np.arange(self.counts.shape[2]) - 1
+        representatives = 2 * self.gamma ** keys / (self.gamma + 1)
+        representatives[0] = 0.
+
+        def value_at(rank):
+            # representative value of the bucket containing the given rank
+            bucket = (cumulative <= rank[..., np.newaxis]).sum(axis=-1)
+            return representatives[np.minimum(bucket, len(keys) - 1)]
+
+        # interpolate between the two nearest ranks, as Series.quantile
+        rank = q * np.maximum(total - 1, 0)
+        lower, upper = np.floor(rank), np.ceil(rank)
+        values = value_at(lower) + (rank - lower) * (value_at(upper) - value_at(lower))
+        values = np.where(total > 0, values, np.nan)
+        return pd.DataFrame(values, index=self.index, columns=self.columns)
+
+    def rollup(self, by):
+        """Combine the windows into larger windows
+
+        Parameters
+        ----------
+        by : str or groupby key
+            Resample rule (e.g. 'ME' or 'YE') for windows with a
+            DatetimeIndex, or any key accepted by ``Series.groupby`` applied
+            on the window labels. The windows should be nested in the new
+            ones, e.g. days into weeks or months, but not weeks into months.
+
+        Returns
+        -------
+        QuantileSketch
+        """
+        if isinstance(by, str):
+            by = pd.Grouper(freq=by)
+        grouped = pd.Series(np.arange(len(self.index)), index=self.index).groupby(by)
+        windows = grouped.ngroup().to_numpy()
+        index = grouped.size().index
+
+        counts = np.zeros((len(index),) + self.counts.shape[1:],
+                          dtype=self.counts.dtype)
+        np.add.at(counts, windows, self.counts)
+        return self._with_counts(counts, index=index)
+
+    def combine_columns(self, name="all"):
+        """Single sketch of all columns (e.g. stations) per window"""
+        return self._with_counts(self.counts.sum(axis=1, keepdims=True),
+                                 columns=[name])
+
+    def merge(self, other):
+        """Merge with the sketch of other data for the same columns
+
+        Counts of windows present in both sketches are summed, e.g. to add
+        the sketch of newly appended data of which the first window is not
+        yet complete.
+        """
+        if not self.columns.equals(other.columns):
+            raise ValueError("Only sketches of the same columns can be merged.")
+        if self.relative_accuracy != other.relative_accuracy:
+            raise ValueError("Only sketches of the same accuracy can be merged.")
+        min_key = min(self.min_key, other.min_key)
+        max_key = max(self.min_key + self.counts.shape[2],
+                      other.min_key + other.counts.shape[2]) - 2
+        counts = np.concatenate([self._extend_keys(min_key, max_key),
+                                 other._extend_keys(min_key, max_key)])
+
+        merged = QuantileSketch(counts, self.index.append(other.index),
+                                self.columns, self.relative_accuracy, min_key)
+        return merged.rollup(merged.index)
+
+    def save(self, path):
+        """Save the sketches as a (compressed) numpy ``.npz`` file"""
+        np.savez_compressed(
+            path, counts=self.counts, index=self.index.to_numpy(),
+            index_name=str(self.index.name or ""),
+            columns=self.columns.to_numpy(dtype=str),
+            relative_accuracy=self.relative_accuracy, min_key=self.min_key)
+
+    @classmethod
+    def load(cls, path):
+        """Load sketches saved with :meth:`save`"""
+        with np.load(path) as sketch:
+            index = pd.Index(sketch["index"], name=str(sketch["index_name"]) or None)
+            return cls(sketch["counts"], index,
+                       sketch["columns"], float(sketch["relative_accuracy"]),
+                       int(sketch["min_key"]))
+
+
+def benchmark_quantile_sketch(data, rule="W", q=0.95, relative_accuracy=0.01):
+    """Compare the sketch quantiles with the exact resample quantiles
+
+    Parameters
+    ----------
+    data : DataFrame
+        Hourly values, e.g. ``data.loc['2011', ['BETN029', 'BETR801']]``.
+    rule : str, default "W"
+        Resample rule of the windows.
+    q : float, default 0.95
+        Quantile to compare.
+    relative_accuracy : float, default 0.01
+        Relative accuracy of the sketch.
+
+    Returns
+    -------
+    Series
+        Run time (s) of the exact and sketch path and the maximal and mean
+        relative error of the sketch.
+    """
+    t_start = time.perf_counter()
+    exact = data.resample(rule).quantile(q)
+    t_exact = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    approximate = QuantileSketch.from_resample(
+        data, rule, relative_accuracy=relative_accuracy).quantile(q)
+    t_sketch = time.perf_counter() - t_start
+
+    error = ((approximate - exact).abs() / exact).to_numpy()
+    error = error[np.isfinite(error)]
+    return pd.Series({"time_exact": t_exact, "time_sketch": t_sketch,
+                      "max_relative_error": error.max(),
+                      "mean_relative_error": error.mean()})
+
+
+def _reduce(values, reduction, axis):
+    """Reduce an axis, without warnings for all-NaN min/max cells"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return reduction(values, axis=axis, keepdims=True)
+
+
+def check_exceedance_counter(data, batch_sizes=(1, 7, 24, 1000), seed=0):
+    """Compare :class:`ExceedanceCounter` with the pandas expression
+
+    The hourly data is fed to the counter in randomly sized batches (drawn
+    from ``batch_sizes``) and the result is compared with the batch
+    ``rolling(8).mean().resample('D').max() > 100`` yearly counts.
+
+    Parameters
+    ----------
+    data : DataFrame
+        Regular hourly data, e.g. the output of ``read_airbase_folder``.
+    batch_sizes : sequence of int
+        Possible number of hours per appended batch.
+    seed : int, default 0
+        Seed of the random batch sizes.
+    """
+    expected = data.rolling(8).mean().resample('D').max() > 100
+    expected = expected.groupby(expected.index.year).sum()
+
+    rng = np.random.default_rng(seed)
+    counter = ExceedanceCounter(data.columns)
+    position = 0
+    while position < len(data):
+        size = rng.choice(batch_sizes)
+        counter.update(data.iloc[position:position + size])
+        position += size
+
+    pd.testing.assert_frame_equal(counter.exceedances(), expected,
+                                  check_names=False)
+
+
+def main(data_folder="./data", store_file_name="airbase_data.bin",
+         profiles_file_name="airbase_profiles.npz"):
+    """Build the profile cube of the processed AirBase data
+
+    Parameters
+    ----------
+    data_folder : str or Path, default "./data"
+        Folder containing the store written by ``load_airbase.main``.
+    store_file_name : str
+        File name of the memory-mapped store of the processed data.
+    profiles_file_name : str
+        File name of the profile cube, saved next to the store.
+    """
+    data_folder = Path(data_folder)
+
+    logger.info("Building the profile cube of the processed AirBase data.")
+    data = AirbaseStore(data_folder / store_file_name).to_frame()
+    cube = ProfileCube.from_data(data.astype(np.float64))
+
+    logger.info("Writing the profile cube to disk.")
+    cube.save(data_folder / profiles_file_name)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Precompute aggregates of the processed AirBase data.'
+    )
+    parser.add_argument('--data-folder', default="./data",
+                        help='Folder with the AirBase data files.')
+    parser.add_argument('--check', action='store_true',
+                        help='Compare the incremental helpers with pandas.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare the quantile sketches with the exact quantiles.')
+    args = parser.parse_args()
+
+    if args.check:
+        data = read_airbase_folder(args.data_folder)
+        check_exceedance_counter(data)
+        check_exceedance_counter(data['1999':])
+        print("Incremental exceedance counts equal to the pandas results.")
+    elif args.benchmark:
+        data = read_airbase_folder(args.data_folder)['1999':]
+        print(benchmark_quantile_sketch(data.loc['2011', ['BETN029', 'BETR801']]))
+        print(benchmark_quantile_sketch(data, "ME"))
+    else:
+        main(args.data_folder)
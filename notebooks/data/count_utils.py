@@ -0,0 +1,395 @@
+import argparse
+import logging
+import timeit
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+def _factorize(values):
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, pd.Index(uniques, name=getattr(values, "name", None))
+
+
+def _count_codes(codes, size):
+    """Distinct codes in [0, size) and their number of occurrences"""
+    if size <= 4 * len(codes) + 2**16:
+        # the counts of all possible codes fit in memory, count in one pass
+        counts = np.bincount(codes, minlength=size)
+        present = np.flatnonzero(counts)
+        return present, counts[present]
+    return np.unique(codes, return_counts=True)
+
+
+class SparseCrosstab:
+    """Counts of the combinations of two keys, stored as non-empty cells
+
+    The equivalent of ``pd.crosstab(rows, columns)`` (or a pivot table with
+    ``aggfunc='count'``) that only stores the observed combinations, as row
+    and column codes with their counts (sorted on row, then column).
+
+    Parameters
+    ----------
+    row_codes, column_codes : ndarray of int
+        Position of the row and column key of each non-empty cell.
+    counts : ndarray of int
+        Number of records of each non-empty cell.
+    index, columns : Index
+        Row and column keys.
+    """
+
+    def __init__(self, row_codes, column_codes, counts, index, columns):
+        self.row_codes = row_codes
+        self.column_codes = column_codes
+        self.counts = counts
+        self.index = index
+        self.columns = columns
+
+    @classmethod
+    def from_keys(cls, rows, columns):
+        """Count the combinations of two keys
+
+        Both keys are factorized and the combinations counted at once,
+        records with a missing key are not counted.
+
+        Parameters
+        ----------
+        rows, columns : Series or array-like
+            Key of each record, e.g. the species name and the plot.
+
+        Returns
+        -------
+        SparseCrosstab
+        """
+        row_codes, index = _factorize(rows)
+        column_codes, column_index = _factorize(columns)
+        valid = (row_codes >= 0) & (column_codes >= 0)
+
+        n_columns = len(column_index)
+        cells = (row_codes[valid].astype(np.int64) * n_columns
+                 + column_codes[valid])
+        cells, counts = _count_codes(cells, len(index) * n_columns)
+        return cls(cells // n_columns, cells % n_columns, counts, index,
+                   column_index)
+
+    @classmethod
+    def from_frame(cls, data, index, columns):
+        """Count the combinations of two columns of a DataFrame
+
+        Parameters
+        ----------
+        data : DataFrame
+            Records, e.g. the survey data.
+        index, columns : str
+            Column names of the row and column key.
+
+        Returns
+        -------
+        SparseCrosstab
+        """
+        return cls.from_keys(data[index], data[columns])
+
+    @property
+    def shape(self):
+        return len(self.index), len(self.columns)
+
+    @property
+    def nnz(self):
+        """Number of non-empty cells"""
+        return len(self.counts)
+
+    @property
+    def density(self):
+        """Fraction of non-empty cells"""
+        return self.nnz / max(self.shape[0] * self.shape[1], 1)
+
+    def to_dense(self, fill_value=0):
+        """Counts as a (dense) DataFrame, e.g. to plot with ``sns.heatmap``
+
+        Parameters
+        ----------
+        fill_value : scalar, default 0
+            Value of the empty cells, 0 as ``pd.crosstab`` or NaN as a
+            pivot table with ``aggfunc='count'``.
+
+        Returns
+        -------
+        DataFrame
+        """
+        dtype = self.counts.dtype if fill_value == 0 else np.float64
+        dense = np.full(self.shape, fill_value, dtype=dtype)
+        dense[self.row_codes, self.column_codes] = self.counts
+        return pd.DataFrame(dense, index=self.index, columns=self.columns)
+
+    def to_series(self):
+        """Counts of the non-empty cells with a (rows, columns) MultiIndex
+
+        Equivalent to ``groupby([rows, columns]).size()``.
+        """
+        index = pd.MultiIndex(levels=[self.index, self.columns],
+                              codes=[self.row_codes, self.column_codes],
+                              names=[self.index.name, self.columns.name])
+        return pd.Series(self.counts, index=index)
+
+    def to_scipy(self):
+        """Counts as a ``scipy.sparse.csr_matrix`` (requires scipy)"""
+        try:
+            from scipy import sparse
+        except ImportError:
+            raise ImportError("Converting to a sparse matrix requires scipy.")
+        return sparse.csr_matrix(
+            (self.counts, (self.row_codes, self.column_codes)),
+            shape=self.shape)
+
+    def _rollup(self, weights, axis):
+        codes, labels = ((self.column_codes, self.columns) if axis == 0
+                         else (self.row_codes, self.index))
+        return pd.Series(np.bincount(codes, weights=weights,
+                                     minlength=len(labels)).astype(np.int64),
+                         index=labels)
+
+    def sum(self, axis=0):
+        """Number of records per column (axis 0) or per row (axis 1)"""
+        return self._rollup(self.counts, axis)
+
+    def nunique(self, axis=0):
+        """Number of distinct keys per column (axis 0) or per row (axis 1)
+
+        E.g. the number of species per plot for a species by plot crosstab,
+        equivalent to ``groupby(columns)[rows].nunique()``.
+        """
+        return self._rollup(None, axis)
+
+
+def benchmark_sparse_crosstab(n_records=(10**5, 10**6), n_species=2000,
+                              n_plots=5000, repeat=3):
+    """Compare the sparse crosstab with pivot_table on synthetic records
+
+    Parameters
+    ----------
+    n_records : tuple of int
+        Number of records to count.
+    n_species, n_plots : int
+        Number of distinct row and column keys.
+    repeat : int, default 3
+        Number of timings, the best is reported.
+
+    Returns
+    -------
+    DataFrame
+        Best time in seconds per approach and number of records.
+    """
+    rng = np.random.default_rng(0)
+    timings = {}
+    for n in n_records:
+        data = pd.DataFrame({
+            "name": [f"species {i}" for i in rng.zipf(1.5, n) % n_species],
+            "verbatimLocality": rng.integers(0, n_plots, n),
+            "datasetName": "synthetic",
+        })
+        sparse = SparseCrosstab.from_frame(data, "name", "verbatimLocality")
+        pivot = data.pivot_table(index="name", columns="verbatimLocality",
+                                 values="datasetName", aggfunc='count')
+        pd.testing.assert_frame_equal(sparse.to_dense(np.nan), pivot,
+                                      check_dtype=False, check_names=False)
+
+        timings[n] = {
+            "pivot_table": min(timeit.repeat(
+                lambda: data.pivot_table(index="name",
+                                         columns="verbatimLocality",
+                                         values="datasetName",
+                                         aggfunc='count'),
+                number=1, repeat=repeat)),
+            "sparse": min(timeit.repeat(
+                lambda: SparseCrosstab.from_frame(data, "name",
+                                                  "verbatimLocality"),
+                number=1, repeat=repeat)),
+            "density": sparse.density,
+        }
+        logger.info(f"{n} records: {timings[n]}")
+
+    return pd.DataFrame(timings).transpose().rename_axis("records")
+
+
+# resample rule: (datetime64 unit, number of units per period, shift in
+# units to the start of the first period, label at the period end)
+PERIOD_RULES = {
+    "YE": ("Y", 1, 0, True),
+    "YS": ("Y", 1, 0, False),
+    "QE": ("M", 3, 0, True),
+    "QS": ("M", 3, 0, False),
+    "ME": ("M", 1, 0, True),
+    "MS": ("M", 1, 0, False),
+    # weeks from Monday till Sunday, 1970-01-01 is a Thursday
+    "W": ("D", 7, 3, True),
+    "D": ("D", 1, 0, False),
+    "h": ("h", 1, 0, False),
+}
+
+
+def period_codes(dates, freq):
+    """Integer code of the calendar period of each datetime
+
+    Consecutive periods have consecutive codes.
+
+    Parameters
+    ----------
+    dates : array-like of datetime64
+        Datetimes, without missing values.
+    freq : str
+        Resample rule, one of the keys of ``PERIOD_RULES``.
+
+    Returns
+    -------
+    ndarray of int64
+    """
+    unit, step, shift, _ = PERIOD_RULES[freq]
+    units = np.asarray(dates).astype(f"datetime64[{unit}]").astype(np.int64)
+    return (units + shift) // step
+
+
+def period_labels(codes, freq, unit="ns"):
+    """Labels of period codes as used by ``resample`` for the rule
+
+    The end of the period (at midnight) for the 'E' rules and 'W', the
+    start otherwise, with the datetime resolution ``unit``.
+    """
+    period_unit, step, shift, label_end = PERIOD_RULES[freq]
+    codes = np.asarray(codes, dtype=np.int64)
+    start = (codes * step - shift).astype(f"datetime64[{period_unit}]")
+    if label_end:
+        next_start = ((codes + 1) * step - shift).astype(
+            f"datetime64[{period_unit}]")
+        labels = next_start.astype("datetime64[D]") - np.timedelta64(1, "D")
+    else:
+        labels = start
+    return pd.DatetimeIndex(labels.astype(f"datetime64[{unit}]"))
+
+
+def count_by_period(data, by, on, freq, unstack=False):
+    """Number of records per group and calendar period
+
+    Equivalent to ``data.groupby(by).resample(freq, on=on).size()``: each
+    group has all periods from its first till its last record, including
+    the empty ones. The period codes are computed once and combined with
+    the group codes, to count all groups in a single ``bincount`` instead
+    of a resample per group.
+
+    Parameters
+    ----------
+    data : DataFrame
+        Records, e.g. the survey data.
+    by : str
+        Column to group on, e.g. 'name'.
+    on : str
+        Datetime column, e.g. 'eventDate'.
+    freq : str
+        Resample rule, one of the keys of ``PERIOD_RULES`` (e.g. 'ME').
+    unstack : bool, default False
+        Return a table with the periods as index and the groups as columns
+        (as ``.unstack(level=0)``), with NaN outside the range of a group.
+
+    Returns
+    -------
+    Series or DataFrame
+        Counts with a (group, period) MultiIndex, or the unstacked table.
+    """
+    if freq not in PERIOD_RULES:
+        raise ValueError(f"freq must be one of {list(PERIOD_RULES)}, "
+                         f"got '{freq}'")
+    group_codes, groups = _factorize(data[by])
+    dates = data[on].to_numpy()
+    valid = (group_codes >= 0) & ~np.isnat(dates)
+    group_codes = group_codes[valid]
+    periods = period_codes(dates[valid], freq)
+
+    first_period = periods.min() if len(periods) else 0
+    n_periods = periods.max() - first_period + 1 if len(periods) else 0
+    cells = group_codes * n_periods + (periods - first_period)
+    counts = np.bincount(cells, minlength=len(groups) * n_periods)
+    counts = counts.reshape(len(groups), n_periods)
+
+    # range of periods from the first till the last record of each group
+    positions = np.arange(n_periods)
+    present = counts > 0
+    first = present.argmax(axis=1)
+    last = n_periods - 1 - present[:, ::-1].argmax(axis=1)
+    in_range = (positions >= first[:, None]) & (positions <= last[:, None])
+
+    labels = period_labels(first_period + positions, freq,
+                           unit=np.datetime_data(dates.dtype)[0]).rename(on)
+    if unstack:
+        if in_range.all():
+            table = counts.T
+        else:
+            table = np.where(in_range, counts, np.nan).T
+        return pd.DataFrame(table, index=labels, columns=groups)
+
+    group_index, period_index = np.nonzero(in_range)
+    index = pd.MultiIndex(levels=[groups, labels],
+                          codes=[group_index, period_index],
+                          names=[by, on])
+    return pd.Series(counts[group_index, period_index], index=index)
+
+
+def benchmark_count_by_period(n_groups=(4, 40, 400, 4000), n_records=10**5,
+                              freq="ME", repeat=3):
+    """Compare count_by_period with groupby().resample().size()
+
+    Parameters
+    ----------
+    n_groups : tuple of int
+        Number of groups to benchmark.
+    n_records : int
+        Number of synthetic records (daily dates over 25 years).
+    freq : str, default 'ME'
+        Resample rule.
+    repeat : int, default 3
+        Number of timings, the best is reported.
+
+    Returns
+    -------
+    DataFrame
+        Best time in seconds per approach and number of groups.
+    """
+    rng = np.random.default_rng(0)
+    dates = (np.datetime64("1977-01-01")
+             + rng.integers(0, 25 * 365, n_records).astype("timedelta64[D]"))
+    timings = {}
+    for n in n_groups:
+        data = pd.DataFrame({
+            "name": [f"species {i}" for i in rng.integers(0, n, n_records)],
+            "eventDate": pd.to_datetime(dates),
+        })
+        reference = data.groupby("name").resample(freq, on="eventDate").size()
+        pd.testing.assert_series_equal(
+            count_by_period(data, "name", "eventDate", freq), reference)
+
+        timings[n] = {
+            "groupby_resample": min(timeit.repeat(
+                lambda: data.groupby("name").resample(
+                    freq, on="eventDate").size(),
+                number=1, repeat=repeat)),
+            "count_by_period": min(timeit.repeat(
+                lambda: count_by_period(data, "name", "eventDate", freq),
+                number=1, repeat=repeat)),
+        }
+        logger.info(f"{n} groups: {timings[n]}")
+
+    return pd.DataFrame(timings).transpose().rename_axis("groups")
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the counting helpers.'
+    )
+    parser.parse_args()
+
+    print(benchmark_sparse_crosstab())
+    print(benchmark_count_by_period())
@@ -0,0 +1,86 @@
+import pandas as pd
+import numpy as np
+
+
+def parse_unique(values, format=None, errors="raise"):
+    """Parse date(time) strings, parsing each distinct value only once
+
+    Parameters
+    ----------
+    values : Series
+        Date(time) strings, e.g. a day column repeated for many records.
+        Categorical columns are used as such, other columns are converted.
+    format : str, optional
+        Format passed to :func:`pandas.to_datetime`, inferred by default.
+    errors : {'raise', 'coerce'}, default 'raise'
+        Passed to :func:`pandas.to_datetime`.
+
+    Returns
+    -------
+    Series
+        Parsed datetimes with the same index as ``values``.
+    """
+    values = values.astype("category")
+    parsed = pd.DatetimeIndex(pd.to_datetime(values.cat.categories,
+                                             format=format, errors=errors))
+    # code -1 (missing value) is filled with NaT
+    datetimes = parsed.take(values.cat.codes.to_numpy(), allow_fill=True,
+                            fill_value=pd.NaT)
+    return pd.Series(datetimes, index=values.index, name=values.name)
+
+
+def datetime_from_day_and_hour(days, hours, format=None, replace_hours=None):
+    """Combine a day (string) column and an integer hour column
+
+    Each distinct day is parsed once and the hours are added as integer
+    time offsets, instead of parsing a concatenated string for every row.
+
+    Parameters
+    ----------
+    days : Series
+        Day strings, e.g. '2020-09-24'.
+    hours : Series
+        Hour of the day as integers, missing hours give a missing datetime.
+    format : str, optional
+        Format of the day strings, inferred by default.
+    replace_hours : dict, optional
+        Hour values to replace before adding them to the day, e.g.
+        ``{99: 0}`` for unknown hours.
+
+    Returns
+    -------
+    Series
+        Datetimes with the same index as ``days``.
+    """
+    hours = hours.to_numpy(dtype=np.float64, na_value=np.nan)
+    for old, new in (replace_hours or {}).items():
+        hours = np.where(hours == old, new, hours)
+    return parse_unique(days, format=format) + pd.to_timedelta(hours, unit="h")
+
+
+def datetime_from_parts(year, month, day, errors="raise"):
+    """Datetimes from year, month and day columns, parsing each date once
+
+    Equivalent to ``pd.to_datetime(df[["year", "month", "day"]])`` for
+    integer columns, with invalid dates (e.g. 31 April) turned into NaT
+    when ``errors='coerce'``.
+
+    Parameters
+    ----------
+    year, month, day : Series
+        Integer date parts.
+    errors : {'raise', 'coerce'}, default 'raise'
+        Passed to :func:`pandas.to_datetime`.
+
+    Returns
+    -------
+    Series
+        Datetimes with the same index as ``year``.
+    """
+    dates = (year.to_numpy(dtype=np.int64) * 10000
+             + month.to_numpy(dtype=np.int64) * 100
+             + day.to_numpy(dtype=np.int64))
+    dates = pd.Series(pd.Categorical(dates), index=year.index)
+    dates = dates.cat.rename_categories(
+        ["{:08d}".format(date) for date in dates.cat.categories])
+    return parse_unique(dates, format="%Y%m%d", errors=errors)
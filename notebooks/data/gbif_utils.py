@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+GBIF_MATCH_URL = "https://api.gbif.org/v1/species/match"
+
+# a week, the GBIF backbone taxonomy does not change more often
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+class NameMatchCache:
+    """On-disk cache of GBIF name matching responses
+
+    The responses are stored as JSON, keyed on the name and the strict
+    option of the request, together with the time they were received.
+
+    Parameters
+    ----------
+    path : str or Path
+        JSON file of the cache, created when missing.
+    ttl : float, default one week
+        Time in seconds after which a cached response is requested again.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.entries = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text())
+
+    @staticmethod
+    def _key(name, strict):
+        return f"{name}|{bool(strict)}"
+
+    def get(self, name, strict):
+        """Cached response, None when not available or expired"""
+        entry = self.entries.get(self._key(name, strict))
+        if entry is None or time.time() - entry["time"] > self.ttl:
+            return None
+        return entry["message"]
+
+    def set(self, name, strict, message):
+        """Add a response to the cache (saved to disk with ``save``)"""
+        self.entries[self._key(name, strict)] = {"time": time.time(),
+                                                 "message": message}
+
+    def save(self):
+        """Write the cache to disk"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        temp_path.write_text(json.dumps(self.entries))
+        os.replace(temp_path, self.path)
+
+
+def _request_match(session, url, name, strict):
+    response = session.get(url, params={"strict": strict, "name": name},
+                           timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+async def name_match_async(names, strict=True, max_concurrent=8,
+                           url=GBIF_MATCH_URL, session=None,
+                           return_exceptions=False):
+    """Perform GBIF name matching for multiple names concurrently
+
+    Coroutine scheduling the requests with asyncio. The requests themselves
+    are blocking ``requests`` calls, run in worker threads (no async HTTP
+    client is needed) that share the connection pool of a single session,
+    with at most ``max_concurrent`` requests at the same time.
+
+    Parameters
+    ----------
+    names : iterable of str
+        Scientific names, e.g. 'Callipepla squamata'.
+    strict : bool, default True
+        Perform the matching with the strict option.
+    max_concurrent : int, default 8
+        Maximum number of simultaneous requests.
+    url : str
+        URL of the GBIF species match service.
+    session : requests.Session, optional
+        Session to use, by default a new session is created and closed.
+    return_exceptions : bool, default False
+        Return the exception of a failed request in place of its message,
+        instead of raising it (and losing the other messages).
+
+    Returns
+    -------
+    list of dict
+        Message returned by the GBIF matching service for each name.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def match(name):
+        async with semaphore:
+            return await asyncio.to_thread(_request_match, session, url,
+                                           name, strict)
+
+    close_session = session is None
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_concurrent,
+                                                max_retries=3)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    try:
+        return await asyncio.gather(*(match(name) for name in names),
+                                    return_exceptions=return_exceptions)
+    finally:
+        if close_session:
+            session.close()
+
+
+def _run(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # e.g. inside a Jupyter notebook, which already runs an event loop
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def name_match_many(names, strict=True, cache_file=None, ttl=DEFAULT_TTL,
+                    max_concurrent=8, url=GBIF_MATCH_URL, errors="raise"):
+    """Perform GBIF name matching for the distinct names, using a cache
+
+    The messages of the successful requests are cached, also when the
+    request of other names fails.
+
+    Parameters
+    ----------
+    names : iterable of str
+        Scientific names, duplicates are requested only once.
+    strict : bool, default True
+        Perform the matching with the strict option.
+    cache_file : str or Path, optional
+        JSON file to cache the responses in, no caching by default.
+    ttl : float, default one week
+        Time in seconds a cached response remains valid.
+    max_concurrent : int, default 8
+        Maximum number of simultaneous requests.
+    url : str
+        URL of the GBIF species match service.
+    errors : {'raise', 'ignore'}, default 'raise'
+        Raise the error of the first failed name after caching the other
+        messages, or return None as the message of the failed names.
+
+    Returns
+    -------
+    dict
+        Message returned by the GBIF matching service for each distinct name.
+    """
+    names = list(dict.fromkeys(names))
+    cache = NameMatchCache(cache_file, ttl=ttl) if cache_file else None
+
+    messages = {}
+    if cache is not None:
+        for name in names:
+            message = cache.get(name, strict)
+            if message is not None:
+                messages[name] = message
+    missing = [name for name in names if name not in messages]
+    logger.info(f"{len(names) - len(missing)} of {len(names)} names cached, "
+                f"requesting {len(missing)} names.")
+
+    failed = {}
+    if missing:
+        matched = _run(name_match_async(missing, strict=strict, url=url,
+                                        max_concurrent=max_concurrent,
+                                        return_exceptions=True))
+        for name, message in zip(missing, matched):
+            if isinstance(message, Exception):
+                failed[name] = message
+                messages[name] = None
+                continue
+            messages[name] = message
+            if cache is not None:
+                cache.set(name, strict, message)
+        if cache is not None:
+            cache.save()
+
+    if failed:
+        logger.warning(f"Name matching failed for {len(failed)} names: "
+                       f"{list(failed)}")
+        if errors == "raise":
+            raise next(iter(failed.values()))
+
+    return {name: messages[name] for name in names}
+
+
+def annotate_species(unique_species, strict=True, **kwargs):
+    """GBIF name matching information of the genus and species combinations
+
+    Parameters
+    ----------
+    unique_species : DataFrame
+        Table with a 'genus' and a 'species' column.
+    strict : bool, default True
+        Perform the matching with the strict option.
+    **kwargs
+        Passed to :func:`name_match_many`, e.g. ``cache_file`` or ``errors``.
+
+    Returns
+    -------
+    DataFrame
+        The messages of the matching service, with the index of
+        ``unique_species`` and a column for each field of the messages
+        (``df_species_annotated`` of the case2 processing notebook).
+    """
+    names = unique_species["genus"] + " " + unique_species["species"]
+    messages = name_match_many(names, strict=strict, **kwargs)
+    # failed names (with errors='ignore') get missing values
+    species_annotated = {key: messages[name] or {}
+                         for key, name in names.items()}
+    return pd.DataFrame(species_annotated).transpose()
+
+
+def main(survey_file="./data/surveys.csv", species_file="./data/species.csv",
+         cache_file="./data/gbif_name_match.json", max_concurrent=8):
+    """Annotate the species of the survey data set with GBIF information
+
+    Parameters
+    ----------
+    survey_file : str
+        CSV file with the survey data, with a 'species' code column.
+    species_file : str
+        CSV file with the genus and species name of the species codes.
+    cache_file : str
+        JSON file to cache the GBIF responses in.
+    max_concurrent : int, default 8
+        Maximum number of simultaneous requests.
+    """
+    survey_data = pd.read_csv(survey_file, usecols=["species"])
+    species_data = pd.read_csv(species_file, sep=";")
+    unique_species = (species_data[species_data["species_id"].isin(
+        survey_data["species"])][["genus", "species"]]
+                      .drop_duplicates().dropna())
+
+    start = time.perf_counter()
+    df_species_annotated = annotate_species(unique_species,
+                                            cache_file=cache_file,
+                                            max_concurrent=max_concurrent)
+    logger.info(f"Annotated {len(df_species_annotated)} species in "
+                f"{time.perf_counter() - start:.2f} s.")
+    print(df_species_annotated[["scientificName", "status", "usageKey"]])
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Annotate the survey species with GBIF name matching.'
+    )
+    parser.add_argument('--cache-file', default="./data/gbif_name_match.json",
+                        help='JSON file to cache the GBIF responses in.')
+    parser.add_argument('--max-concurrent', type=int, default=8,
+                        help='Maximum number of simultaneous requests.')
+
+    args = parser.parse_args()
+
+    main(cache_file=args.cache_file, max_concurrent=args.max_concurrent)
@@ -0,0 +1,140 @@
+import argparse
+import logging
+import timeit
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_transformer(crs_from, crs_to):
+    """Transformer between two coordinate reference systems, created once
+
+    The coordinates are always in x, y (longitude, latitude) order,
+    whatever the axis order of the CRS definition.
+
+    Parameters
+    ----------
+    crs_from, crs_to : str or int
+        Coordinate reference systems, e.g. 'EPSG:32612' or 4326.
+
+    Returns
+    -------
+    pyproj.Transformer
+    """
+    return Transformer.from_crs(crs_from, crs_to, always_xy=True)
+
+
+def transform_coordinates(x, y, crs_from, crs_to="EPSG:4326"):
+    """Transform arrays of coordinates in a single call
+
+    Parameters
+    ----------
+    x, y : array-like
+        Coordinates in ``crs_from``, e.g. UTM easting and northing.
+    crs_from : str or int
+        Coordinate reference system of the input.
+    crs_to : str or int, default 'EPSG:4326'
+        Coordinate reference system of the output (WGS84 by default).
+
+    Returns
+    -------
+    x, y : ndarray
+        Transformed coordinates, longitude and latitude for WGS84.
+    """
+    transformer = get_transformer(crs_from, crs_to)
+    return transformer.transform(np.asarray(x, dtype=np.float64),
+                                 np.asarray(y, dtype=np.float64))
+
+
+def add_wgs84_coordinates(data, x="xutm", y="yutm", crs="EPSG:32612"):
+    """Add the decimalLongitude and decimalLatitude columns to a table
+
+    Parameters
+    ----------
+    data : DataFrame
+        Table with projected coordinates, e.g. the plot locations.
+    x, y : str, default 'xutm' and 'yutm'
+        Columns with the coordinates.
+    crs : str or int, default 'EPSG:32612'
+        Coordinate reference system of the coordinates (UTM 12N).
+
+    Returns
+    -------
+    DataFrame
+        ``data`` with the Darwin Core 'decimalLongitude' and
+        'decimalLatitude' columns added (or replaced).
+    """
+    longitude, latitude = transform_coordinates(data[x], data[y], crs)
+    return data.assign(decimalLongitude=longitude, decimalLatitude=latitude)
+
+
+def _transform_utm_to_wgs(row):
+    # row-wise reference of the case2 processing notebook
+    transformer = Transformer.from_crs("EPSG:32612", "epsg:4326")
+    return pd.Series(transformer.transform(row['xutm'], row['yutm']))
+
+
+def benchmark_add_wgs84_coordinates(plot_file="./data/plot_location.xlsx",
+                                    sizes=(24, 1000, 100000), repeat=3):
+    """Compare the array transform with the row-wise apply
+
+    Parameters
+    ----------
+    plot_file : str
+        Excel file with the plot locations.
+    sizes : tuple of int
+        Number of locations to transform, the plots are repeated.
+    repeat : int, default 3
+        Number of timings, the best is reported.
+
+    Returns
+    -------
+    DataFrame
+        Best time in seconds of both approaches per number of locations.
+    """
+    plot_data = pd.read_excel(plot_file, skiprows=3, index_col=0)
+
+    timings = {}
+    for size in sizes:
+        locations = plot_data.iloc[np.arange(size) % len(plot_data)]
+        locations = locations.reset_index(drop=True)
+
+        fast = add_wgs84_coordinates(locations)
+        # EPSG:4326 is in latitude, longitude order without always_xy
+        reference = locations.iloc[:100].apply(_transform_utm_to_wgs, axis=1)
+        np.testing.assert_allclose(
+            fast[["decimalLatitude", "decimalLongitude"]].iloc[:100],
+            reference)
+
+        timings[size] = {
+            "apply": min(timeit.repeat(
+                lambda: locations.apply(_transform_utm_to_wgs, axis=1),
+                number=1, repeat=repeat)) if size <= 1000 else np.nan,
+            "vectorized": min(timeit.repeat(
+                lambda: add_wgs84_coordinates(locations),
+                number=1, repeat=repeat)),
+        }
+        logger.info(f"{size} locations: {timings[size]}")
+
+    return pd.DataFrame(timings).transpose().rename_axis("locations")
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the UTM to WGS84 transform of the plots.'
+    )
+    parser.add_argument('--plot-file', default="./data/plot_location.xlsx",
+                        help='Excel file with the plot locations.')
+
+    args = parser.parse_args()
+
+    print(benchmark_add_wgs84_coordinates(args.plot_file))
@@ -0,0 +1,810 @@
+import argparse
+import json
+import logging
+import os
+import struct
+import subprocess
+import sys
+import time
+import timeit
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+HOURS = ["{:02d}".format(i) for i in range(24)]
+FLAGS = ['flag' + str(i) for i in range(24)]
+COLUMN_NAMES = ['date'] + [item for pair in zip(HOURS, FLAGS) for item in pair]
+NA_VALUES = [-999, -9999]
+NS_PER_HOUR = 3600 * 10**9
+
+# bits of the per-hour quality codes, see read_airbase_file_fast
+QUALITY_MEASURED = 1  # a value is reported (not -999/-9999)
+QUALITY_VALID = 2  # the validity flag of the hour is positive
+QUALITY_OK = QUALITY_MEASURED | QUALITY_VALID
+
+
+def read_airbase_file(filename, station):
+    """
+    Read hourly AirBase data files.
+
+    Reference implementation of the case4_air_quality_processing notebook,
+    kept to validate and benchmark :func:`read_airbase_file_fast`.
+
+    Parameters
+    ----------
+    filename : string
+        Path to the data file.
+    station : string
+        Name of the station.
+
+    Returns
+    -------
+    DataFrame
+        Processed dataframe.
+    """
+    # read the actual data
+    data = pd.read_csv(filename, sep='\t', header=None,
+                       na_values=NA_VALUES, names=COLUMN_NAMES)
+
+    # drop the 'flag' columns
+    data = data.drop([col for col in data.columns if 'flag' in col], axis=1)
+
+    # reshape
+    data_stacked = pd.melt(data, id_vars=['date'], var_name='hour')
+
+    # parse to datetime and remove redundant columns
+    data_stacked.index = pd.to_datetime(
+        data_stacked['date'] + data_stacked['hour'], format="%Y-%m-%d%H")
+    data_stacked = data_stacked.drop(['date', 'hour'], axis=1)
+    data_stacked = data_stacked.rename(columns={'value': station})
+
+    return data_stacked
+
+
+def _quality_codes(values, flags):
+    """Combine the hourly values and validity flags into uint8 quality codes"""
+    quality = np.where(np.isnan(values), 0, QUALITY_MEASURED).astype(np.uint8)
+    quality |= np.where(flags > 0, QUALITY_VALID, 0).astype(np.uint8)
+    return quality
+
+
+def read_airbase_file_fast(filename, station, quality=False):
+    """
+    Read hourly AirBase data files without the string-based datetime parsing.
+
+    The day x 24 block of hourly values is flattened row by row into a
+    single array and the index is calculated as the date of each line plus
+    the hour offset, so only the date column is ever parsed.
+
+    Parameters
+    ----------
+    filename : string
+        Path to the data file.
+    station : string
+        Name of the station.
+    quality : bool, default False
+        Also return the validity flags of each hour, as uint8 quality codes
+        combining the ``QUALITY_MEASURED`` and ``QUALITY_VALID`` bits.
+
+    Returns
+    -------
+    DataFrame
+        Processed dataframe with a chronologically sorted DatetimeIndex.
+        Equal to ``read_airbase_file(filename, station).sort_index()``.
+    DataFrame
+        Only when ``quality=True``, the quality codes with the same index
+        and column as the processed dataframe.
+    """
+    dtype = {hour: np.float64 for hour in HOURS}
+    if quality:
+        dtype.update({flag: np.int8 for flag in FLAGS})
+    data = pd.read_csv(filename, sep='\t', header=None, names=COLUMN_NAMES,
+                       usecols=list(dtype) + ['date'], na_values=NA_VALUES,
+                       dtype=dtype)
+
+    # (n_days, 24) block -> 1D array in chronological order
+    values = data[HOURS].to_numpy().ravel()
+
+    days = data['date'].to_numpy().astype("datetime64[D]")
+    hour_offsets = np.arange(24, dtype="timedelta64[h]")
+    timestamps = (days[:, np.newaxis] + hour_offsets).ravel()
+    index = pd.DatetimeIndex(timestamps.astype("datetime64[ns]"))
+
+    data_stacked = pd.DataFrame({station: values}, index=index)
+    if not quality:
+        return data_stacked
+
+    flags = data[FLAGS].to_numpy().ravel()
+    return data_stacked, pd.DataFrame(
+        {station: _quality_codes(values, flags)}, index=index)
+
+
+def benchmark_read_airbase_file(data_folder="./data", repeat=3):
+    """Compare the reference and fast AirBase readers on the hourly files
+
+    Parameters
+    ----------
+    data_folder : str or Path, default "./data"
+        Folder containing the ``*0008001*`` AirBase files.
+    repeat : int, default 3
+        Number of runs per reader and file, the best run is reported.
+
+    Returns
+    -------
+    DataFrame
+        Best run time (s) per file for both readers and the speedup.
+    """
+    results = {}
+    for filename in sorted(Path(data_folder).glob("*0008001*")):
+        station = filename.name[:7]
+        reference = read_airbase_file(filename, station)
+        fast = read_airbase_file_fast(filename, station)
+        pd.testing.assert_frame_equal(reference.sort_index(), fast)
+
+        results[station] = {
+            reader.__name__: min(timeit.repeat(
+                lambda: reader(filename, station), number=1, repeat=repeat))
+            for reader in [read_airbase_file, read_airbase_file_fast]
+        }
+    results = pd.DataFrame.from_dict(results, orient="index")
+    results["speedup"] = (results["read_airbase_file"]
+                          / results["read_airbase_file_fast"])
+    return results
+
+
+def _period_from_filename(filename):
+    """Start and end date encoded in an AirBase file name
+
+    E.g. ``BETR8010000800100hour.1-1-1990.31-12-2012`` covers 1990-01-01
+    till 2012-12-31.
+    """
+    try:
+        _, start, end = Path(filename).name.split(".")
+        return (pd.to_datetime(start, format="%d-%m-%Y"),
+                pd.to_datetime(end, format="%d-%m-%Y"))
+    except ValueError:
+        raise ValueError(f"No period found in the file name {filename}, "
+                         "provide the start and end explicitly.")
+
+
+def _peak_memory_mb():
+    """Peak resident memory (MB) of this process and of its child processes"""
+    if resource is None:
+        return {"main": np.nan, "workers": np.nan}
+    # ru_maxrss is expressed in kilobytes on Linux
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "workers": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def _read_station_hours(filename, quality=False):
+    """Read a single AirBase file as (station, hour positions, values, quality)
+
+    Process pool worker: only the plain arrays are returned to keep the
+    data pickled back to the main process small.
+    """
+    station = Path(filename).name[:7]
+    if quality:
+        data, data_quality = read_airbase_file_fast(filename, station, quality=True)
+        data_quality = data_quality[station].to_numpy()
+    else:
+        data, data_quality = read_airbase_file_fast(filename, station), None
+    return (station, data.index.asi8 // NS_PER_HOUR, data[station].to_numpy(),
+            data_quality)
+
+
+def read_airbase_files(filenames, max_workers=None, start=None, end=None,
+                       quality=False):
+    """Read hourly AirBase files in parallel into a single frame
+
+    The files are parsed in a process pool and each result is written into
+    a preallocated hourly frame as soon as it is ready, instead of keeping
+    all station frames in memory for a final ``pd.concat``.
+
+    Parameters
+    ----------
+    filenames : list of str or Path
+        Hourly AirBase files, one per station.
+    max_workers : int, optional
+        Number of worker processes, default the number of CPUs.
+    start, end : datetime-like, optional
+        Period of the combined frame. Derived from the file names by default,
+        data outside of the period is dropped.
+    quality : bool, default False
+        Also return the quality codes of each hour, see
+        :func:`read_airbase_file_fast`.
+
+    Returns
+    -------
+    DataFrame
+        Hourly values with one column per station and a regular hourly
+        ``datetime`` index from ``start`` till the last hour of ``end``.
+        Hours missing in every file are kept as NaN rows.
+    DataFrame
+        Only when ``quality=True``, the uint8 quality codes aligned with the
+        hourly values (0 for hours missing in a file).
+    """
+    filenames = [Path(filename) for filename in filenames]
+    stations = [filename.name[:7] for filename in filenames]
+
+    if start is None or end is None:
+        periods = [_period_from_filename(filename) for filename in filenames]
+        start = min(period[0] for period in periods) if start is None else start
+        end = max(period[1] for period in periods) if end is None else end
+    index = pd.date_range(pd.Timestamp(start).floor("D"),
+                          pd.Timestamp(end).floor("D") + pd.Timedelta(hours=23),
+                          freq="h", name="datetime")
+    first_hour = index[0].value // NS_PER_HOUR
+
+    values = np.full((len(index), len(stations)), np.nan)
+    if quality:
+        quality_codes = np.zeros((len(index), len(stations)), dtype=np.uint8)
+
+    t_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_read_station_hours, filename, quality): column
+                   for column, filename in enumerate(filenames)}
+        for future in as_completed(futures):
+            column = futures.pop(future)
+            station, hours, station_values, station_quality = future.result()
+            positions = hours - first_hour
+            in_period = (positions >= 0) & (positions < len(index))
+            values[positions[in_period], column] = station_values[in_period]
+            if quality:
+                quality_codes[positions[in_period], column] = \
+                    station_quality[in_period]
+            logger.info(f"Station {station} ready")
+
+    memory = _peak_memory_mb()
+    logger.info(f"Read {len(filenames)} files in "
+                f"{time.perf_counter() - t_start:.2f}s, peak memory "
+                f"{memory['main']:.0f} MB (main) / "
+                f"{memory['workers']:.0f} MB (largest worker)")
+
+    data = pd.DataFrame(values, index=index, columns=stations)
+    if quality:
+        return data, pd.DataFrame(quality_codes, index=index, columns=stations)
+    return data
+
+
+def read_airbase_folder(data_folder="./data", pattern="*0008001*", **kwargs):
+    """Read all hourly AirBase files of a folder in parallel
+
+    Parameters
+    ----------
+    data_folder : str or Path, default "./data"
+        Folder containing the AirBase files.
+    pattern : str, default "*0008001*"
+        Glob pattern to select the files (hourly NO2 by default).
+    **kwargs
+        Passed to :func:`read_airbase_files` (``max_workers``, ``start``,
+        ``end`` and ``quality``).
+
+    Returns
+    -------
+    DataFrame or tuple of DataFrame
+        See :func:`read_airbase_files`.
+    """
+    filenames = sorted(Path(data_folder).glob(pattern))
+    if not filenames:
+        raise FileNotFoundError(f"No files matching {pattern} in {data_folder}")
+    return read_airbase_files(filenames, **kwargs)
+
+
+def valid_hours(quality):
+    """Boolean mask of the hours with a reported value and a positive flag"""
+    return (quality & QUALITY_OK) == QUALITY_OK
+
+
+def resample_with_coverage(data, quality, rule, how="mean",
+                           min_coverage=0.75, threshold=None):
+    """Aggregate hourly data per window, only where enough hours are valid
+
+    Hours that are not valid (see :func:`valid_hours`) are ignored and the
+    result of windows with a fraction of valid hours below ``min_coverage``
+    is set to NaN, e.g. a daily mean requires 18 out of 24 valid hours with
+    the default threshold. All steps are vectorized resample reductions.
+
+    Parameters
+    ----------
+    data : DataFrame or Series
+        Hourly values with a DatetimeIndex.
+    quality : DataFrame or Series
+        Quality codes aligned with ``data``.
+    rule : str
+        Resample rule of the windows, e.g. 'D', 'ME' or 'YE'.
+    how : {'mean', 'median', 'max', 'min', 'sum', 'exceedances'}, default 'mean'
+        Aggregation of the valid hours of each window. 'exceedances' counts
+        the valid hours above ``threshold``.
+    min_coverage : float, default 0.75
+        Minimal fraction of valid hours of a window.
+    threshold : float, optional
+        Limit value, required for ``how='exceedances'``.
+
+    Returns
+    -------
+    DataFrame or Series
+        Aggregated values per window, NaN for insufficient coverage.
+
+    Examples
+    --------
+    Daily maxima and yearly number of hours above 200 µg/m³:
+
+    >>> data, quality = read_airbase_folder("./data", quality=True)
+    >>> daily_max = resample_with_coverage(data, quality, "D", how="max")
+    >>> exceedances = resample_with_coverage(
+    ...     data, quality, "YE", how="exceedances", threshold=200)
+    """
+    # regular hourly index to count the hours of each window
+    data = data.asfreq("h")
+    quality = quality.reindex(data.index, fill_value=0)
+
+    valid = valid_hours(quality)
+    coverage = valid.resample(rule).mean()
+
+    values = data.where(valid)
+    if how == "exceedances":
+        if threshold is None:
+            raise ValueError("A threshold is required to count exceedances.")
+        result = (values > threshold).resample(rule).sum()
+    elif how in ["mean", "median", "max", "min", "sum"]:
+        result = values.resample(rule).agg(how)
+    else:
+        raise ValueError(f"Unsupported aggregation {how!r}")
+
+    return result.where(coverage >= min_coverage)
+
+
+AIRBASE_FILENAME = (
+    r"^(?P<station>(?P<country>[A-Z]{2})[A-Z0-9]{5})"
+    r"(?P<component>\d{5})\d{5}(?P<resolution>[a-z]+)"
+    r"\.(?P<start>\d{1,2}-\d{1,2}-\d{4})\.(?P<end>\d{1,2}-\d{1,2}-\d{4})$"
+)
+
+
+class AirbaseCatalog:
+    """Table of the AirBase files of a folder, parsed from the file names
+
+    The folder is listed once and the station, country, component code,
+    averaging period and date range encoded in each file name (e.g.
+    ``BETR8010000800100hour.1-1-1990.31-12-2012``) are stored in
+    :attr:`files`. Queries only use this table, files are only opened by
+    :meth:`load` and only for the selected series.
+
+    Parameters
+    ----------
+    data_folder : str or Path, default "./data"
+        Folder containing the AirBase files.
+
+    Examples
+    --------
+    >>> catalog = AirbaseCatalog("./data")
+    >>> catalog.select(station="BETR", component=8)
+    >>> data = catalog.load(country="FR", start="2010", end="2012")
+    """
+
+    def __init__(self, data_folder="./data"):
+        self.data_folder = Path(data_folder)
+        with os.scandir(self.data_folder) as entries:
+            names = pd.Series([entry.name for entry in entries
+                               if entry.is_file()], dtype=object)
+
+        files = names.str.extract(AIRBASE_FILENAME).dropna()
+        files["component"] = files["component"].astype(int)
+        files["resolution"] = files["resolution"].astype("category")
+        for column in ["start", "end"]:
+            files[column] = pd.to_datetime(files[column], format="%d-%m-%Y")
+        files["path"] = [self.data_folder / name for name in names[files.index]]
+
+        self.files = (files.sort_values(["station", "component", "start"])
+                           .reset_index(drop=True))
+
+    def __len__(self):
+        return len(self.files)
+
+    def select(self, station=None, country=None, component=None,
+               resolution=None, start=None, end=None):
+        """Files matching all the given criteria
+
+        Parameters
+        ----------
+        station : str or list of str, optional
+            Station code or prefix of the station code (e.g. "BETR").
+        country : str or list of str, optional
+            Two-letter country code, e.g. "BE".
+        component : int or list of int, optional
+            AirBase component code, e.g. 8 for NO2.
+        resolution : str, optional
+            Averaging period, e.g. "hour".
+        start, end : datetime-like, optional
+            Only files overlapping with this period.
+
+        Returns
+        -------
+        DataFrame
+            Subset of :attr:`files`.
+        """
+        mask = pd.Series(True, index=self.files.index)
+        if station is not None:
+            prefixes = (station,) if isinstance(station, str) else tuple(station)
+            mask &= self.files["station"].str.startswith(prefixes)
+        if country is not None:
+            countries = [country] if isinstance(country, str) else country
+            mask &= self.files["country"].isin(countries)
+        if component is not None:
+            components = np.atleast_1d(component)
+            mask &= self.files["component"].isin(components)
+        if resolution is not None:
+            mask &= self.files["resolution"] == resolution
+        if start is not None:
+            if isinstance(start, str):
+                start = pd.Period(start).start_time
+            mask &= self.files["end"] >= pd.Timestamp(start).floor("D")
+        if end is not None:
+            if isinstance(end, str):
+                end = pd.Period(end).end_time
+            mask &= self.files["start"] <= pd.Timestamp(end)
+        return self.files[mask]
+
+    def load(self, station=None, country=None, component=8, start=None,
+             end=None, **kwargs):
+        """Read the hourly files matching the query into a single frame
+
+        Parameters
+        ----------
+        station, country, component, start, end
+            Query, see :meth:`select`. Hourly NO2 data by default and the
+            result is limited to the ``start`` - ``end`` period.
+        **kwargs
+            Passed to :func:`read_airbase_files` (``max_workers`` and
+            ``quality``).
+
+        Returns
+        -------
+        DataFrame or tuple of DataFrame
+            See :func:`read_airbase_files`.
+        """
+        selection = self.select(station=station, country=country,
+                                component=component, resolution="hour",
+                                start=start, end=end)
+        if selection.empty:
+            raise ValueError("No AirBase files match the query.")
+        if selection["station"].duplicated().any():
+            raise ValueError("Multiple files per station, select a single "
+                             "component to load.")
+
+        if start is None:
+            start = selection["start"].min()
+        elif isinstance(start, str):
+            start = pd.Period(start).start_time
+        if end is None:
+            end = selection["end"].max()
+        elif isinstance(end, str):
+            end = pd.Period(end).end_time
+        return read_airbase_files(selection["path"].tolist(), start=start,
+                                  end=end, **kwargs)
+
+
+# a single benchmark run of read_airbase_folder, printing its results as JSON
+_BENCHMARK_RUN = """
+import json, sys, time
+sys.path.insert(0, sys.argv[3])
+from load_airbase import _peak_memory_mb, read_airbase_folder
+t_start = time.perf_counter()
+read_airbase_folder(sys.argv[1], max_workers=int(sys.argv[2]))
+t_read = time.perf_counter() - t_start
+print(json.dumps({"time": t_read, **_peak_memory_mb()}))
+"""
+
+
+def benchmark_read_airbase_folder(data_folder="./data", workers=(1, 2, 4)):
+    """Wall time and peak memory of the parallel reader per worker count
+
+    Each worker count is run in a fresh Python process, as the peak
+    memory of a process only ever increases.
+
+    Parameters
+    ----------
+    data_folder : str or Path, default "./data"
+        Folder containing the ``*0008001*`` AirBase files.
+    workers : sequence of int
+        Worker counts to compare.
+
+    Returns
+    -------
+    DataFrame
+        Wall time (s), speedup compared to a single worker and the peak
+        memory (MB) of the main process and of the largest worker per
+        worker count.
+    """
+    results = {}
+    for max_workers in workers:
+        run = subprocess.run(
+            [sys.executable, "-c", _BENCHMARK_RUN, str(data_folder),
+             str(max_workers), str(Path(__file__).resolve().parent)],
+            stdout=subprocess.PIPE, text=True, check=True)
+        result = json.loads(run.stdout.splitlines()[-1])
+        results[max_workers] = {
+            "time": result["time"],
+            "peak_memory_main": result["main"],
+            "peak_memory_workers": result["workers"],
+        }
+    results = pd.DataFrame.from_dict(results, orient="index")
+    results.index.name = "max_workers"
+    results.insert(1, "speedup", results["time"].iloc[0] / results["time"])
+    return results
+
+
+STORE_MAGIC = b"AIRBASE\x01"
+STORE_ALIGNMENT = 64
+
+
+def write_airbase_store(data, path, quality=None, dtype=np.float32):
+    """Write hourly station data to a memory-mappable binary store
+
+    The file starts with a small JSON header (start time, frequency and
+    station names) followed by a dense station x hour matrix, so that
+    :class:`AirbaseStore` can open it without parsing any data. The uint8
+    quality codes, if given, are stored as a second station x hour matrix.
+
+    Parameters
+    ----------
+    data : DataFrame
+        Hourly data with a DatetimeIndex and one column per station. Missing
+        hours are added as NaN to obtain a regular hourly time series.
+    path : str or Path
+        File name of the store.
+    quality : DataFrame, optional
+        Quality codes of the hourly data, see :func:`read_airbase_file_fast`.
+    dtype : numpy dtype, default float32
+        Data type of the stored values.
+    """
+    data = data.sort_index().asfreq("h")
+    dtype = np.dtype(dtype)
+    if quality is not None:
+        quality = quality.reindex(index=data.index, columns=data.columns,
+                                  fill_value=0)
+
+    header = json.dumps({
+        "start": data.index[0].isoformat(),
+        "freq": "h",
+        "stations": [str(station) for station in data.columns],
+        "n_hours": len(data),
+        "dtype": dtype.str,
+        "quality": quality is not None,
+    }).encode()
+    # pad the header to keep the data block aligned
+    offset = len(STORE_MAGIC) + 4 + len(header)
+    offset += -offset % STORE_ALIGNMENT
+    header = header.ljust(offset - len(STORE_MAGIC) - 4)
+
+    with open(path, "wb") as f:
+        f.write(STORE_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+
+    matrix = np.memmap(path, dtype=dtype, mode="r+", offset=offset,
+                       shape=(data.shape[1], data.shape[0]))
+    for column, station in enumerate(data.columns):
+        matrix[column] = data[station].to_numpy(dtype=dtype)
+    matrix.flush()
+    del matrix
+
+    if quality is not None:
+        quality_matrix = np.memmap(
+            path, dtype=np.uint8, mode="r+", offset=offset + dtype.itemsize * data.size,
+            shape=(data.shape[1], data.shape[0]))
+        for column, station in enumerate(data.columns):
+            quality_matrix[column] = quality[station].to_numpy(dtype=np.uint8)
+        quality_matrix.flush()
+        del quality_matrix
+
+
+class AirbaseStore:
+    """Memory-mapped station x hour store written by :func:`write_airbase_store`
+
+    Opening a store only reads the header, the values are loaded lazily by
+    the operating system when accessed. Date ranges and single stations (or
+    a regular range of stations) are returned as views on the file.
+
+    Parameters
+    ----------
+    path : str or Path
+        File name of the store.
+
+    Examples
+    --------
+    >>> store = AirbaseStore("data/airbase_data.bin")
+    >>> data = store.to_frame(start="2009")   # data['2009':]
+    >>> df2011 = store.to_frame("2011", "2011")   # data.loc['2011']
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(STORE_MAGIC)) != STORE_MAGIC:
+                raise ValueError(f"{self.path} is not an AirBase store file")
+            header_length, = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_length))
+
+        self.start = pd.Timestamp(header["start"])
+        self.freq = pd.Timedelta(1, unit=header["freq"])
+        self.stations = pd.Index(header["stations"])
+        shape = (len(self.stations), header["n_hours"])
+        offset = len(STORE_MAGIC) + 4 + header_length
+        self.matrix = np.memmap(self.path, dtype=np.dtype(header["dtype"]),
+                                mode="r", offset=offset, shape=shape)
+        self.quality_matrix = None
+        if header.get("quality", False):
+            self.quality_matrix = np.memmap(
+                self.path, dtype=np.uint8, mode="r",
+                offset=offset + self.matrix.nbytes, shape=shape)
+
+    def __len__(self):
+        return self.matrix.shape[1]
+
+    @property
+    def end(self):
+        return self.start + (len(self) - 1) * self.freq
+
+    def _hour_slice(self, start=None, end=None):
+        """Positional slice of the hours between start and end (inclusive)
+
+        Strings are interpreted as periods, like pandas partial string
+        indexing: ``end="2011"`` includes all hours of 2011.
+        """
+        first, last = 0, len(self)
+        if start is not None:
+            if isinstance(start, str):
+                start = pd.Period(start).start_time
+            first = -((self.start - pd.Timestamp(start)) // self.freq)
+        if end is not None:
+            if isinstance(end, str):
+                end = pd.Period(end).end_time
+            last = (pd.Timestamp(end) - self.start) // self.freq + 1
+        first = min(max(first, 0), len(self))
+        return slice(first, max(min(last, len(self)), first))
+
+    def _station_indexer(self, stations=None):
+        """Slice of the stations if possible, to avoid a copy of the data"""
+        if stations is None:
+            return slice(None)
+        if isinstance(stations, str):
+            return self.stations.get_loc(stations)
+        positions = self.stations.get_indexer(stations)
+        if (positions < 0).any():
+            missing = list(np.asarray(stations)[positions < 0])
+            raise KeyError(f"Stations not in the store: {missing}")
+        steps = np.diff(positions)
+        if len(positions) == 1 or ((steps > 0).all() and (steps == steps[0]).all()):
+            step = steps[0] if len(steps) else 1
+            return slice(positions[0], positions[-1] + 1, step)
+        return positions
+
+    def values(self, start=None, end=None, stations=None):
+        """Station x hour array for the selected period and stations
+
+        A view on the memory-mapped file, except when ``stations`` is a list
+        that does not form a regular range of the stored stations.
+        """
+        return self.matrix[self._station_indexer(stations),
+                           self._hour_slice(start, end)]
+
+    def quality(self, start=None, end=None, stations=None):
+        """Station x hour quality codes for the selected period and stations"""
+        if self.quality_matrix is None:
+            raise ValueError(f"{self.path} does not contain quality codes")
+        return self.quality_matrix[self._station_indexer(stations),
+                                   self._hour_slice(start, end)]
+
+    def index(self, start=None, end=None):
+        """Hourly DatetimeIndex of the selected period"""
+        hours = self._hour_slice(start, end)
+        return pd.date_range(self.start + hours.start * self.freq,
+                             periods=hours.stop - hours.start,
+                             freq=self.freq, name="datetime")
+
+    def to_frame(self, start=None, end=None, stations=None, quality=False):
+        """DataFrame (hours x stations) of the selected period and stations
+
+        The returned frame has the same layout as ``pd.read_csv(
+        'data/airbase_data.csv', index_col=0, parse_dates=True)`` and wraps
+        the memory-mapped values without copying them. With ``quality=True``,
+        the quality codes are returned in the same layout instead.
+        """
+        if quality:
+            values = self.quality(start, end, stations)
+        else:
+            values = self.values(start, end, stations)
+        if values.ndim == 1:
+            return pd.Series(np.asarray(values), index=self.index(start, end),
+                             name=stations)
+        columns = self.stations[self._station_indexer(stations)]
+        return pd.DataFrame(np.asarray(values).T, index=self.index(start, end),
+                            columns=columns, copy=False)
+
+
+def read_airbase_store(path, start=None, end=None, stations=None):
+    """Load (a selection of) an AirBase store as a DataFrame
+
+    Parameters
+    ----------
+    path : str or Path
+        File name of the store written by :func:`write_airbase_store`.
+    start, end : datetime-like or str, optional
+        Period to select, strings select the full period (e.g. "2011").
+    stations : str or list of str, optional
+        Stations to select, default all.
+
+    Returns
+    -------
+    DataFrame
+        Hourly data with a ``datetime`` index and one column per station.
+    """
+    return AirbaseStore(path).to_frame(start, end, stations)
+
+
+def main(data_folder="./data",
+         processed_file_name="airbase_data_processed.csv",
+         store_file_name="airbase_data.bin", max_workers=None):
+    """Read all hourly AirBase files of a folder, combine and save to disk
+
+    Parameters
+    ----------
+    data_folder : str or Path, default "./data"
+        Folder containing the ``*0008001*`` AirBase files.
+    processed_file_name : str
+        File name of the combined data set (CSV).
+    store_file_name : str, optional
+        File name of the memory-mapped binary store of the combined data
+        set, see :class:`AirbaseStore`. Set to None to skip the store.
+    max_workers : int, optional
+        Number of worker processes, default the number of CPUs.
+    """
+    data_folder = Path(data_folder)
+
+    logger.info("Reading and combining the individual stations.")
+    combined_data, quality = read_airbase_folder(
+        data_folder, max_workers=max_workers, quality=True)
+
+    logger.info("Writing combined AirBase data file to disk.")
+    combined_data.to_csv(data_folder / processed_file_name)
+    if store_file_name is not None:
+        write_airbase_store(combined_data, data_folder / store_file_name,
+                            quality=quality)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Combine the hourly AirBase NO2 station files.'
+    )
+    parser.add_argument('--data-folder', default="./data",
+                        help='Folder with the AirBase data files.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default all CPUs).')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Benchmark the file readers and the parallel ingestion.')
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(benchmark_read_airbase_file(args.data_folder))
+        print(benchmark_read_airbase_folder(args.data_folder))
+    else:
+        print("Start AirBase data preparation...")
+        main(args.data_folder, max_workers=args.workers)
+        print("...done!")
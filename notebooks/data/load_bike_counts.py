@@ -0,0 +1,230 @@
+import argparse
+import json
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+TIMEZONE = "Europe/Brussels"
+
+DIRECTIONS = ["direction_centre", "direction_mariakerke"]
+
+# rollup tables and their resample rule, from fine to coarse
+RESOLUTIONS = {"hourly": "h", "daily": "D", "monthly": "ME"}
+
+# profile (attribute of the index) and the rollup table it is computed from
+PROFILES = {"hour": "hourly", "dayofweek": "daily", "month": "monthly"}
+
+
+def process_bike_count_data(df):
+    """Process the provided dataframe: parse datetimes and rename columns.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        DataFrame as read from the raw `fietstellingen`,
+        containing the 'Datum', 'Uur5Minuten',
+        'Ordening', 'Totaal', 'Tegenrichting', 'Hoofdrichting' columns.
+
+    Returns
+    -------
+    df2 : pandas.DataFrame
+        DataFrame with the datetime info as index and the
+        `direction_centre` and `direction_mariakerke` columns
+        with the counts.
+    """
+    timestamps = pd.to_datetime(df["Ordening"], format="%Y-%m-%dT%H:%M:%S%z", utc=True)
+    df2 = df.drop(columns=['Datum', 'Uur5Minuten', 'Ordening', 'Code'])
+    df2["timestamp"] = timestamps
+    df2 = df2.set_index("timestamp")
+    df2 = df2.rename(columns={'Tegenrichting': 'direction_centre',
+                              'Hoofdrichting': 'direction_mariakerke',
+                              'Totaal': 'total',
+                              'Locatie': 'location'
+                             })
+    return df2
+
+
+def _merge_sums(table, new, rule):
+    """Add the sums of new rows to a rollup table
+
+    Only the last period of the table can overlap with the new rows, the
+    periods in between (without any counts) are added as zero.
+    """
+    if table is None or table.empty:
+        return new
+    overlap = table.index >= new.index[0]
+    combined = pd.concat([table[overlap], new]).groupby(level=0).sum()
+    # resampling the last stored and the new periods fills the gap between
+    bridge = pd.concat([table[~overlap].iloc[-1:], combined]).resample(rule).sum()
+    return pd.concat([table[~overlap].iloc[:-1], bridge])
+
+
+class BikeCountRollups:
+    """Hourly, daily and monthly counts per direction, updated incrementally
+
+    The 5-minute counts are aggregated in local time (Europe/Brussels), so
+    days and months follow the calendar of the bike counter. Days at the
+    DST transitions have 23 (last Sunday of March) or 25 (last Sunday of
+    October) hours, and the hourly table contains the repeated hour of
+    October twice, once for each UTC offset.
+
+    Parameters
+    ----------
+    tables : dict of DataFrame, optional
+        Rollup table of each resolution (see ``RESOLUTIONS``).
+    last_timestamp : Timestamp, optional
+        Timestamp of the last 5-minute count included in the rollups.
+    tz : str, default 'Europe/Brussels'
+        Time zone to aggregate in.
+    """
+
+    def __init__(self, tables=None, last_timestamp=None, tz=TIMEZONE):
+        self.tables = tables or {}
+        self.last_timestamp = last_timestamp
+        self.tz = tz
+
+    @classmethod
+    def from_counts(cls, df, tz=TIMEZONE):
+        """Rollups of 5-minute counts as returned by process_bike_count_data"""
+        return cls(tz=tz).update(df)
+
+    def update(self, df):
+        """Add new 5-minute counts to the rollups
+
+        Parameters
+        ----------
+        df : DataFrame
+            Counts with a timezone aware DatetimeIndex and the direction
+            columns, e.g. as returned by ``process_bike_count_data``. Rows
+            not later than the last included timestamp are skipped.
+
+        Returns
+        -------
+        BikeCountRollups
+            The updated rollups.
+        """
+        if df.index.tz is None:
+            raise ValueError(
+                "The timestamps need to be timezone aware (e.g. UTC as "
+                "parsed by process_bike_count_data), as local times are "
+                "ambiguous during the autumn DST transition.")
+        counts = df[DIRECTIONS].tz_convert(self.tz).sort_index()
+        if self.last_timestamp is not None:
+            included = counts.index <= self.last_timestamp
+            if included.any():
+                logger.warning(f"Skipping {included.sum()} counts already "
+                               "included in the rollups.")
+                counts = counts[~included]
+        if counts.empty:
+            return self
+
+        # each resolution is aggregated from the previous one
+        new = counts
+        for resolution, rule in RESOLUTIONS.items():
+            new = new.resample(rule).sum()
+            self.tables[resolution] = _merge_sums(self.tables.get(resolution),
+                                                  new, rule)
+        self.last_timestamp = counts.index[-1]
+        return self
+
+    def rollup(self, resolution, start=None, end=None):
+        """Counts per direction at a resolution
+
+        Parameters
+        ----------
+        resolution : {'hourly', 'daily', 'monthly'}
+            Rollup table, equivalent to ``df.resample(rule).sum()`` with the
+            rule 'h', 'D' or 'ME' respectively.
+        start, end : str or Timestamp, optional
+            Period to select (label based, e.g. '2023-01-01').
+
+        Returns
+        -------
+        DataFrame
+        """
+        return self.tables[resolution].loc[start:end]
+
+    def profile(self, by):
+        """Average counts per hour of the day, day of the week or month
+
+        Parameters
+        ----------
+        by : {'hour', 'dayofweek', 'month'}
+            Profile, computed from the hourly, daily and monthly counts
+            respectively, e.g. ``df_hourly.groupby(df_hourly.index.hour).mean()``.
+
+        Returns
+        -------
+        DataFrame
+        """
+        table = self.tables[PROFILES[by]]
+        return table.groupby(getattr(table.index, by)).mean()
+
+    def save(self, folder):
+        """Store the rollup tables as Parquet files in a folder"""
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        for resolution, table in self.tables.items():
+            table.to_parquet(folder / f"{resolution}.parquet")
+        last_timestamp = (None if self.last_timestamp is None
+                          else self.last_timestamp.isoformat())
+        meta = {"tz": self.tz, "last_timestamp": last_timestamp,
+                "resolutions": list(self.tables)}
+        (folder / "rollups.json").write_text(json.dumps(meta, indent=2))
+
+    @classmethod
+    def load(cls, folder):
+        """Read rollups stored with ``save``"""
+        folder = Path(folder)
+        meta = json.loads((folder / "rollups.json").read_text())
+        tables = {resolution: pd.read_parquet(folder / f"{resolution}.parquet")
+                  for resolution in meta["resolutions"]}
+        last_timestamp = meta["last_timestamp"]
+        if last_timestamp is not None:
+            last_timestamp = pd.Timestamp(last_timestamp).tz_convert(meta["tz"])
+        return cls(tables, last_timestamp, tz=meta["tz"])
+
+
+def main(file_names=("./data/fietstelpaal-coupure-links-2022-gent.zip",
+                     "./data/fietstelpaal-coupure-links-2023-gent.zip"),
+         rollup_folder="./data/bike_count_rollups"):
+    """Update the stored rollups with raw bike count files
+
+    Parameters
+    ----------
+    file_names : tuple of str
+        Raw bike counter files, in chronological order.
+    rollup_folder : str
+        Folder with the stored rollups, created when it does not exist.
+    """
+    if (Path(rollup_folder) / "rollups.json").exists():
+        rollups = BikeCountRollups.load(rollup_folder)
+    else:
+        rollups = BikeCountRollups()
+    for file_name in file_names:
+        logger.info(f"Adding {file_name} to the rollups.")
+        df_raw = pd.read_csv(file_name, sep=';')
+        rollups.update(process_bike_count_data(df_raw))
+    rollups.save(rollup_folder)
+    logger.info(f"Rollups up to {rollups.last_timestamp} ready.")
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Update the hourly, daily and monthly bike count rollups.'
+    )
+    parser.add_argument('file_names', nargs='*',
+                        default=["./data/fietstelpaal-coupure-links-2022-gent.zip",
+                                 "./data/fietstelpaal-coupure-links-2023-gent.zip"],
+                        help='Raw bike counter files, in chronological order.')
+
+    args = parser.parse_args()
+
+    main(args.file_names)
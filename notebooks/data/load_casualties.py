@@ -1,62 +1,133 @@
 import argparse
-import urllib
+import hashlib
+import json
 import logging
-from tempfile import tempdir
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tempfile import gettempdir
 from pathlib import Path
 
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
+import requests
 
+from datetime_utils import datetime_from_day_and_hour
 
-def clean_casualties_data(casualties_raw):
-    """Convert raw casualties data to english and restructured format"""
-    casualties = (
-        casualties_raw
-        .drop(columns=[col for col in casualties_raw.columns
-                        if col.endswith("_FR")])
-        .drop(columns=[col for col in casualties_raw.columns
-                        if col.startswith("CD_") and not col.endswith("_REFNIS")])
-        .rename(columns={name: name.removeprefix("TX_").removesuffix("_DESCR_NL")
-                        for name in casualties_raw.columns})
-        .replace("Onbekend", None)
-    )
-    casualties["gender"] = casualties["SEX"].replace(
-        {"Vrouwelijk": "female", "Mannelijk": "male"}
-    )
 
-    casualties["DT_HOUR"] = casualties["DT_HOUR"].replace(99, 0)
-    casualties["datetime"] = pd.to_datetime(
-        casualties["DT_DAY"] + " " + casualties["DT_HOUR"].astype(str) + ":00"
-    )
+logger = logging.getLogger(__name__)
+
+CASUALTIES_OUTPUT_COLUMNS = [
+    "datetime", "week_day", "n_victims", "n_victims_ok", "n_slightly_injured",
+    "n_seriously_injured", "n_dead_30days", "road_user_type", "victim_type",
+    "gender", "age", "road_type", "build_up_area", "light_conditions",
+    "refnis_municipality", "municipality", "refnis_region", "region"
+]
+
+STATBEL_URL = ("https://statbel.fgov.be/sites/default/files/files/opendata/"
+               "Verkeersslachtoffers/TF_ACCIDENTS_VICTIMS_{year}.zip")
+
+# raw columns used by clean_casualties_data and the dtype to read them with,
+# None to let pandas infer the dtype. The integer columns are nullable, as
+# some years have empty values.
+CASUALTIES_COLUMNS = {
+    "DT_DAY": "category",
+    "DT_HOUR": "Int8",
+    "MS_VICT": "Int16",
+    "MS_VIC_OK": "Int16",
+    "MS_SLY_INJ": "Int16",
+    "MS_SERLY_INJ": "Int16",
+    "MS_DEAD_30_DAYS": "Int16",
+    "TX_DAY_OF_WEEK_DESCR_NL": "category",
+    "TX_BUILD_UP_AREA_DESCR_NL": "category",
+    "TX_VICT_TYPE_DESCR_NL": "category",
+    "TX_ROAD_USR_TYPE_DESCR_NL": "category",
+    "TX_ROAD_TYPE_DESCR_NL": "category",
+    "TX_LIGHT_COND_DESCR_NL": "category",
+    "TX_AGE_CLS_DESCR_NL": "category",
+    "TX_MUNTY_DESCR_NL": "category",
+    "TX_RGN_DESCR_NL": "category",
+    "TX_SEX_DESCR_NL": "category",
+    "CD_MUNTY_REFNIS": None,
+    "CD_RGN_REFNIS": None,
+}
 
-    casualties["age"] = casualties["AGE_CLS"].str.replace(
-        " tot ", " - ").str.removesuffix("jaar").str.strip()
-    casualties["age"] = casualties["age"].replace(
-        {"": None, "75 jaar en meer": ">75", ' ': None})
 
-    casualties["DAY_OF_WEEK"] = casualties["DAY_OF_WEEK"].replace({
+def read_casualties_file(file_name):
+    """Read a yearly statbel casualties file, only the columns used further
+
+    Parameters
+    ----------
+    file_name : str or Path
+        Zipped ``TF_ACCIDENTS_VICTIMS_<year>`` file.
+
+    Returns
+    -------
+    DataFrame
+        Raw casualties data with the columns of ``CASUALTIES_COLUMNS``
+        present in the file.
+    """
+    return pd.read_csv(
+        file_name, compression='zip', sep="|",
+        usecols=lambda col: col in CASUALTIES_COLUMNS,
+        dtype={col: dtype for col, dtype in CASUALTIES_COLUMNS.items()
+               if dtype is not None})
+
+
+def benchmark_read_casualties_file(file_name):
+    """Compare reading all columns with :func:`read_casualties_file`
+
+    Parameters
+    ----------
+    file_name : str or Path
+        Zipped ``TF_ACCIDENTS_VICTIMS_<year>`` file.
+
+    Returns
+    -------
+    DataFrame
+        Wall time (s) and peak memory (MB) of both approaches.
+    """
+    readers = {
+        "all columns": lambda: pd.read_csv(file_name, compression='zip',
+                                           sep="|", low_memory=False),
+        "used columns": lambda: read_casualties_file(file_name),
+    }
+    results = {}
+    for name, reader in readers.items():
+        tracemalloc.start()
+        t_start = time.perf_counter()
+        reader()
+        duration = time.perf_counter() - t_start
+        peak_memory = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        results[name] = {"time": duration, "peak_memory": peak_memory}
+    return pd.DataFrame.from_dict(results, orient="index")
+
+
+# Dutch labels that are considered missing in every label column
+MISSING_LABELS = {"Onbekend": None, " ": None}
+
+# Dutch -> English translation of the label columns, as
+# {new column: (label column, {dutch label: english label or None})}.
+# Labels not listed are kept as such.
+TRANSLATIONS = {
+    "gender": ("SEX", {"Vrouwelijk": "female", "Mannelijk": "male"}),
+    "DAY_OF_WEEK": ("DAY_OF_WEEK", {
         "maandag": "Monday", "dinsdag": "Tuesday", "woensdag": "Wednesday",
         "donderdag": "Thursday", "vrijdag": "Friday", "zaterdag": "Saturday",
-        "zondag": "Sunday"})
-    casualties["week_day"] = pd.Categorical(
-        casualties["DAY_OF_WEEK"],
-        categories=["Monday", "Tuesday", "Wednesday",
-                    "Thursday", "Friday", "Saturday", "Sunday"],
-        ordered=True
-    )
-
-    casualties["victim_type"] = casualties["VICT_TYPE"].replace({
+        "zondag": "Sunday"}),
+    "victim_type": ("VICT_TYPE", {
         "Bestuurder": "Driver", "Bromfietser": "Moped driver",
         "Passagier": "Passenger", "Motorfietser": 'Motorcyclist',
         "Fietser": "Cyclist", "Voetganger": "Pedestrian",
-        "Autres victimes": None})
-
-    casualties["build_up_area"] = casualties["BUILD_UP_AREA"].replace({
+        "Autres victimes": None}),
+    "build_up_area": ("BUILD_UP_AREA", {
         "Binnen bebouwde kom": "Inside built-up area",
-        "Buiten bebouwde kom": "Outside built-up area",
-        " ": None})
-
-    casualties["ROAD_USR_TYPE"] = casualties["ROAD_USR_TYPE"].replace({
+        "Buiten bebouwde kom": "Outside built-up area"}),
+    "ROAD_USR_TYPE": ("ROAD_USR_TYPE", {
         'Personenauto': 'Passenger car',
         'Auto voor dubbel gebruik': 'Dual-purpose vehicle',
         'Lichte vrachtauto': 'Light truck',
@@ -89,35 +160,105 @@ def clean_casualties_data(casualties_raw):
         'Kampeerwagen': 'Campervan',
         'Landbouwtractor': 'Tractor',
         'Andere weggebruiker': None,
-        'Niet ingevuld': None,
-        np.nan: None
-    })
-
-    casualties["LIGHT_COND"] = casualties["LIGHT_COND"].replace(
-        {'Bij klaarlichte dag': 'In broad daylight',
-         'Nacht, ontstoken openbare verlichting': 'Night, public lighting lit',
-         'Dageraad - schemering': 'Dawn',
-         'Nacht, openbare verlichting aanwezig, maar niet ontstoken': 'Night, no public lighting',
-         'Nacht, geen openbare verlichting': 'Night, no public lighting',
-         ' ': None
-        })
-
-    casualties["ROAD_TYPE"] = casualties["ROAD_TYPE"].replace({
+        'Niet ingevuld': None}),
+    "LIGHT_COND": ("LIGHT_COND", {
+        'Bij klaarlichte dag': 'In broad daylight',
+        'Nacht, ontstoken openbare verlichting': 'Night, public lighting lit',
+        'Dageraad - schemering': 'Dawn',
+        'Nacht, openbare verlichting aanwezig, maar niet ontstoken': 'Night, no public lighting',
+        'Nacht, geen openbare verlichting': 'Night, no public lighting'}),
+    "ROAD_TYPE": ("ROAD_TYPE", {
         'Gemeenteweg': 'Municipal road',
         'Gewestweg': 'Regional road',
-        'Autosnelweg': 'Motorway'
-    })
-
-    casualties["RGN"] = casualties["RGN"].replace({
+        'Autosnelweg': 'Motorway'}),
+    "RGN": ("RGN", {
         'Vlaams Gewest': 'Flemish Region',
         'Brussels Hoofdstedelijk Gewest': 'Brussels-Capital Region',
-        'Waals Gewest': 'Walloon Region'
-    })
+        'Waals Gewest': 'Walloon Region'}),
+}
+
+
+def recode_categories(values, mapping):
+    """Translate the labels of a column on the level of its categories
+
+    The column is converted to a categorical once, after which only the
+    distinct labels are translated. Labels translated to the same value
+    are merged into a single category.
+
+    Parameters
+    ----------
+    values : Series
+        Column with the labels to translate.
+    mapping : dict or callable
+        Translation {label: new label}, labels not in the dict are kept, or
+        a function applied to each label. None translates to missing.
+
+    Returns
+    -------
+    Series
+        Categorical column with the translated labels.
+    """
+    values = values.astype("category")
+    if callable(mapping):
+        translated = [mapping(label) for label in values.cat.categories]
+    else:
+        translated = [mapping.get(label, label) for label in values.cat.categories]
+    new_codes, new_categories = pd.factorize(pd.Index(translated, dtype=object))
+
+    codes = values.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, new_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, new_categories),
+                     index=values.index, name=values.name)
+
+
+def _translate_age_class(label):
+    """Dutch age class (e.g. '35 tot 39 jaar') to '35 - 39', None if unknown"""
+    age = label.replace(" tot ", " - ").removesuffix("jaar").strip()
+    return {"": None, "75 jaar en meer": ">75"}.get(age, age)
+
+
+def clean_casualties_data(casualties_raw):
+    """Convert raw casualties data to english and restructured format"""
+    casualties = (
+        casualties_raw
+        .drop(columns=[col for col in casualties_raw.columns
+                        if col.endswith("_FR")])
+        .drop(columns=[col for col in casualties_raw.columns
+                        if col.startswith("CD_") and not col.endswith("_REFNIS")])
+        .rename(columns={name: name.removeprefix("TX_").removesuffix("_DESCR_NL")
+                        for name in casualties_raw.columns})
+    )
+    label_columns = [name.removeprefix("TX_").removesuffix("_DESCR_NL")
+                     for name in casualties_raw.columns
+                     if name.startswith("TX_") and name.endswith("_DESCR_NL")]
+    for column in label_columns:
+        casualties[column] = recode_categories(casualties[column], MISSING_LABELS)
+    for column, (label_column, translation) in TRANSLATIONS.items():
+        casualties[column] = recode_categories(casualties[label_column],
+                                               translation)
+
+    # unknown hours (99) are set to midnight
+    casualties["datetime"] = datetime_from_day_and_hour(
+        casualties["DT_DAY"], casualties["DT_HOUR"], replace_hours={99: 0}
+    )
+
+    casualties["age"] = recode_categories(casualties["AGE_CLS"],
+                                          _translate_age_class)
+
+    casualties["week_day"] = pd.Categorical(
+        casualties["DAY_OF_WEEK"],
+        categories=["Monday", "Tuesday", "Wednesday",
+                    "Thursday", "Friday", "Saturday", "Sunday"],
+        ordered=True
+    )
+
     casualties["CD_RGN_REFNIS"] = casualties["CD_RGN_REFNIS"].replace(
         {'02000': 2000, '03000': 3000, '04000': 4000, ' ': None}
     )
 
-    casualties = casualties.replace(" ", None)
+    # the label columns are already cleaned, remaining text columns only
+    object_columns = casualties.select_dtypes(object).columns
+    casualties[object_columns] = casualties[object_columns].replace(" ", None)
     casualties = casualties.rename(columns={
         "MS_VICT": "n_victims",
         "MS_VIC_OK": "n_victims_ok",
@@ -136,14 +277,398 @@ def clean_casualties_data(casualties_raw):
         columns=[
             "DT_DAY", "DT_HOUR", "DAY_OF_WEEK", "SEX", "VICT_TYPE",
             "BUILD_UP_AREA", "AGE_CLS", "CD_PROV_REFNIS", "PROV",
-            "CD_DSTR_REFNIS", "ADM_DSTR"]
+            "CD_DSTR_REFNIS", "ADM_DSTR"],
+        errors="ignore"
     )
 
     return casualties_clean
 
 
+def benchmark_clean_casualties_data(file_name, reference=None,
+                                    n_years=(1, 4, 16)):
+    """Time clean_casualties_data, optionally against a reference cleaning
+
+    The bundled single year is repeated to emulate a multi-year data set.
+    A reference (e.g. an earlier, ``replace()`` based cleaning) cleans the
+    raw data read with the default dtypes (as before
+    ``read_casualties_file``), and the output columns of both are checked
+    to be equal.
+
+    Parameters
+    ----------
+    file_name : str or Path
+        Zipped ``TF_ACCIDENTS_VICTIMS_<year>`` file.
+    reference : callable, optional
+        Cleaning function to compare with, taking the raw DataFrame.
+    n_years : sequence of int
+        Number of (repeated) years to clean at once.
+
+    Returns
+    -------
+    DataFrame
+        Number of rows and run time (s) of clean_casualties_data
+        ("categories") and of the reference ("reference", when given) per
+        number of years.
+    """
+    casualties_raw = read_casualties_file(file_name)
+    if reference is not None:
+        reference_raw = pd.read_csv(file_name, compression='zip', sep="|",
+                                    usecols=list(casualties_raw.columns),
+                                    low_memory=False)
+    results = {}
+    for n in n_years:
+        casualties = pd.concat([casualties_raw] * n, ignore_index=True)
+        t_start = time.perf_counter()
+        casualties_clean = clean_casualties_data(casualties)
+        results[n] = {"rows": len(casualties),
+                      "categories": time.perf_counter() - t_start}
+        if reference is None:
+            continue
+
+        reference_input = pd.concat([reference_raw] * n, ignore_index=True)
+        t_start = time.perf_counter()
+        reference_clean = reference(reference_input)
+        results[n]["reference"] = time.perf_counter() - t_start
+
+        columns = [col for col in CASUALTIES_OUTPUT_COLUMNS
+                   if col in casualties_clean.columns]
+        # compare the values, the dtypes differ (categoricals, nullable ints)
+        pd.testing.assert_frame_equal(
+            casualties_clean[columns].astype(object).replace({np.nan: None}),
+            reference_clean[columns].astype(object).replace({np.nan: None}))
+    results = pd.DataFrame.from_dict(results, orient="index")
+    results.index.name = "years"
+    return results
+
+
+class DownloadManifest:
+    """Size and checksum of the completed downloads, stored as JSON
+
+    Parameters
+    ----------
+    path : str or Path
+        JSON file of the manifest, created when missing.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text())
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def checksum(file_name):
+        sha256 = hashlib.sha256()
+        with open(file_name, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def verify(self, file_name):
+        """True if the file matches the size and checksum in the manifest"""
+        entry = self.entries.get(Path(file_name).name)
+        return (entry is not None
+                and Path(file_name).stat().st_size == entry["size"]
+                and self.checksum(file_name) == entry["sha256"])
+
+    def record(self, file_name):
+        """Add (or update) the size and checksum of a file"""
+        entry = {"size": Path(file_name).stat().st_size,
+                 "sha256": self.checksum(file_name)}
+        with self._lock:
+            self.entries[Path(file_name).name] = entry
+            # write to a temporary file first to never leave a partial manifest
+            temp_path = self.path.with_name(self.path.name + ".tmp")
+            temp_path.write_text(json.dumps(self.entries, indent=2))
+            os.replace(temp_path, self.path)
+
+
+def download_file(session, url, file_name, manifest, chunk_size=2**20):
+    """Download a file, resuming a partial download from a previous run
+
+    The data is written to ``<file_name>.part`` and only renamed to
+    ``file_name`` when complete, so an existing ``file_name`` is never a
+    truncated download. A partial file is continued with an HTTP Range
+    request when the server supports it.
+
+    Parameters
+    ----------
+    session : requests.Session
+        Session to reuse the connections of.
+    url : str
+        URL of the file.
+    file_name : Path
+        Destination of the download.
+    manifest : DownloadManifest
+        Manifest to verify existing files and record new downloads.
+    chunk_size : int, default 1 MiB
+        Size of the blocks written to disk.
+
+    Returns
+    -------
+    Path
+        The downloaded (or already available and verified) file.
+    """
+    file_name = Path(file_name)
+    if file_name.exists():
+        if manifest.verify(file_name):
+            return file_name
+        logger.warning(f"{file_name.name} does not match the download "
+                       "manifest, downloading again.")
+        file_name.unlink()
+
+    partial = file_name.with_name(file_name.name + ".part")
+    offset = partial.stat().st_size if partial.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with session.get(url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 416:
+            # the partial file does not match the remote file, start over
+            partial.unlink()
+            return download_file(session, url, file_name, manifest, chunk_size)
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            logger.info(f"Resume download of {file_name.name} at {offset} bytes.")
+            mode = "ab"
+            expected_size = int(response.headers["Content-Range"].split("/")[-1])
+        else:
+            mode = "wb"
+            expected_size = response.headers.get("Content-Length")
+            expected_size = int(expected_size) if expected_size else None
+
+        with open(partial, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+
+    size = partial.stat().st_size
+    if expected_size is not None and size != expected_size:
+        raise IOError(f"Incomplete download of {url}: {size} of "
+                      f"{expected_size} bytes.")
+    os.replace(partial, file_name)
+    manifest.record(file_name)
+    return file_name
+
+
+def download_casualties(years, download_folder, url_template=STATBEL_URL,
+                        max_workers=4):
+    """Download the yearly casualties files concurrently
+
+    The files are downloaded by a pool of threads sharing a pool of
+    connections. The years are yielded as soon as their file is available,
+    so they can be processed while the other years are still downloading.
+
+    Parameters
+    ----------
+    years : iterable of int
+        Years to download.
+    download_folder : str or Path
+        Folder to store the files and the download manifest.
+    url_template : str
+        URL of the yearly files, with a ``{year}`` placeholder.
+    max_workers : int, default 4
+        Number of concurrent downloads.
+
+    Yields
+    ------
+    year : int
+    file_name : Path
+        Downloaded file. Years of which the download failed are logged and
+        skipped.
+    """
+    download_folder = Path(download_folder)
+    download_folder.mkdir(parents=True, exist_ok=True)
+    manifest = DownloadManifest(download_folder / "manifest.json")
+
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers,
+                                            max_retries=3)
+    with requests.Session() as session, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        futures = {
+            executor.submit(
+                download_file, session, url_template.format(year=year),
+                download_folder / f"TF_ACCIDENTS_VICTIMS_{year}.zip",
+                manifest): year
+            for year in years
+        }
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                yield year, future.result()
+            except (requests.RequestException, IOError) as err:
+                logger.error(f"Download of year {year} failed: {err}")
+
+
+def _read_partition_manifest(partition_folder):
+    manifest_file = Path(partition_folder) / "partitions.json"
+    if manifest_file.exists():
+        return json.loads(manifest_file.read_text())
+    return {}
+
+
+def _write_partition_manifest(partition_folder, partitions):
+    manifest_file = Path(partition_folder) / "partitions.json"
+    temp_file = manifest_file.with_name(manifest_file.name + ".tmp")
+    temp_file.write_text(json.dumps(partitions, indent=2, sort_keys=True))
+    os.replace(temp_file, manifest_file)
+
+
+def update_partitions(years, download_folder, partition_folder,
+                      url_template=STATBEL_URL, max_workers=4):
+    """Store each cleaned year as a sorted Parquet partition
+
+    Only years without a partition or of which the downloaded file changed
+    (according to its checksum) are read and cleaned, the other partitions
+    are kept as such. The partitions are listed in a ``partitions.json``
+    manifest with the checksum of their source file, the number of rows
+    and the columns.
+
+    Parameters
+    ----------
+    years : iterable of int
+        Years to download and partition.
+    download_folder : str or Path
+        Folder to store the downloaded files.
+    partition_folder : str or Path
+        Folder to store the partitions and their manifest.
+    url_template : str
+        URL of the yearly files, with a ``{year}`` placeholder.
+    max_workers : int, default 4
+        Number of concurrent downloads.
+
+    Returns
+    -------
+    dict
+        Manifest entries of the requested years that have a partition.
+    """
+    partition_folder = Path(partition_folder)
+    partition_folder.mkdir(parents=True, exist_ok=True)
+    partitions = _read_partition_manifest(partition_folder)
+
+    downloads = download_casualties(years, download_folder,
+                                    url_template=url_template,
+                                    max_workers=max_workers)
+    for year, file_name in downloads:
+        checksum = DownloadManifest.checksum(file_name)
+        entry = partitions.get(str(year))
+        if (entry is not None and entry["source_sha256"] == checksum
+                and (partition_folder / entry["file"]).exists()):
+            logger.info(f"Partition of year {year} is up to date.")
+            continue
+
+        logger.info(f"Handling year {year}")
+        try:
+            casualties = clean_casualties_data(read_casualties_file(file_name))
+        except:
+            logger.error(f"Data processing of year {year} failed")
+            continue
+        casualties = casualties.sort_values("datetime", kind="stable")
+
+        partition_file = f"casualties_{year}.parquet"
+        casualties.to_parquet(partition_folder / partition_file, index=False)
+        partitions[str(year)] = {"file": partition_file,
+                                 "source_sha256": checksum,
+                                 "rows": len(casualties),
+                                 "columns": list(casualties.columns)}
+        _write_partition_manifest(partition_folder, partitions)
+
+    return {int(year): partitions[str(year)] for year in years
+            if str(year) in partitions}
+
+
+def merge_sorted_partitions(file_names, output_file, columns, key="datetime",
+                            batch_size=2**16):
+    """Write the rows of sorted partitions to a single CSV file in order
+
+    Streaming k-way merge: each partition is read in batches and only the
+    rows up to the smallest last key of the current batches are written,
+    so no more than one batch per partition is in memory. Rows with a
+    missing key (e.g. an unknown hour) are kept out of the merge and
+    written at the end, in the order of the partitions, as
+    ``sort_values(key, kind="stable")`` puts them last.
+
+    Parameters
+    ----------
+    file_names : list of Path
+        Parquet files, each sorted on ``key``.
+    output_file : str or Path
+        CSV file to write.
+    columns : list of str
+        Columns of the output, missing columns of a partition are empty.
+    key : str, default 'datetime'
+        Column to merge on.
+    batch_size : int, default 65536
+        Number of rows read at once from a partition.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    missing = [[] for _ in file_names]
+
+    def batches(file_name, missing_rows):
+        parquet_file = pq.ParquetFile(file_name)
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            batch = batch.to_pandas().reindex(columns=columns)
+            is_missing = batch[key].isna()
+            if is_missing.any():
+                missing_rows.append(batch[is_missing])
+                batch = batch[~is_missing]
+            if not batch.empty:
+                yield batch
+
+    readers = [batches(file_name, missing_rows)
+               for file_name, missing_rows in zip(file_names, missing)]
+    buffers = [next(reader, None) for reader in readers]
+
+    # explicit format, as a chunk with midnights only would be written as dates
+    date_format = "%Y-%m-%d %H:%M:%S"
+    n_rows = 0
+    with open(output_file, "w", newline="") as f:
+        pd.DataFrame(columns=columns).to_csv(f, index=False)
+        while True:
+            active = [i for i, buffer in enumerate(buffers)
+                      if buffer is not None]
+            if not active:
+                break
+            # rows up to this key are never preceded by rows of a later batch
+            bound = min(buffers[i][key].iat[-1] for i in active)
+
+            # rows equal to the bound are held back after a partition that
+            # can have more of them in its next batch, to keep the order of
+            # the partitions for equal keys
+            heads = []
+            blocked = False
+            for i in active:
+                n = buffers[i][key].searchsorted(
+                    bound, side="left" if blocked else "right")
+                blocked = blocked or buffers[i][key].iat[-1] == bound
+                heads.append(buffers[i].iloc[:n])
+                buffers[i] = buffers[i].iloc[n:]
+                if buffers[i].empty:
+                    buffers[i] = next(readers[i], None)
+
+            chunk = pd.concat([head for head in heads if not head.empty])
+            chunk = chunk.sort_values(key, kind="stable")
+            chunk.to_csv(f, index=False, header=False, date_format=date_format)
+            n_rows += len(chunk)
+
+        # all partitions are read, the rows without key come last
+        for missing_rows in missing:
+            for chunk in missing_rows:
+                chunk.to_csv(f, index=False, header=False,
+                             date_format=date_format)
+                n_rows += len(chunk)
+    return n_rows
+
+
 def main(start_year=2005, end_year=2020,
-         processed_file_name="casualties.csv"):
+         processed_file_name="casualties.csv", download_folder=None,
+         url_template=STATBEL_URL, max_workers=4, partition_folder=None):
     """Download casualties data, run cleaning function, concat and save as CSV
 
     Parameters
@@ -154,50 +679,63 @@ def main(start_year=2005, end_year=2020,
         End year to download data from.
     processed_file_name : str
         File name of the concatenated clean data set.
+    download_folder : str or Path, optional
+        Folder to store the downloaded files, default a ``casualties``
+        folder in the temporary directory.
+    url_template : str
+        URL of the yearly files, with a ``{year}`` placeholder.
+    max_workers : int, default 4
+        Number of concurrent downloads.
+    partition_folder : str or Path, optional
+        Folder with a cleaned and sorted partition per year. When given,
+        only missing or changed years are processed and the output is
+        written as a merge of the partitions.
     """
-    download_folder = Path(tempdir) / "casualties"
-    download_folder.mkdir(exist_ok=True)
+    if download_folder is None:
+        download_folder = Path(gettempdir()) / "casualties"
+
+    if partition_folder is not None:
+        logger.info(f"Updating casualties partitions from {start_year} till {end_year}.")
+        partitions = update_partitions(
+            range(start_year, end_year+1), download_folder, partition_folder,
+            url_template=url_template, max_workers=max_workers)
+        available = set().union(*(entry["columns"]
+                                  for entry in partitions.values()))
+        logger.info("Merging partitions to combined casualties data file.")
+        merge_sorted_partitions(
+            [Path(partition_folder) / entry["file"]
+             for entry in partitions.values()],
+            Path("./data") / processed_file_name,
+            columns=[col for col in CASUALTIES_OUTPUT_COLUMNS
+                     if col in available])
+        logger.info("Combined casualties data file ready.")
+        return
 
-    logger.info("Start processing causalties Belgium open data from {start_year} till {end_year}.")
-    casualties_all = []
-    for year in range(start_year, end_year+1):
+    logger.info(f"Start processing causalties Belgium open data from {start_year} till {end_year}.")
+    casualties_all = {}
+    downloads = download_casualties(range(start_year, end_year+1),
+                                    download_folder, url_template=url_template,
+                                    max_workers=max_workers)
+    # years are processed as soon as downloaded, while the others continue
+    for year, file_name in downloads:
         logger.info(f"Handling year {year}")
-        file_name = download_folder / f"TF_ACCIDENTS_VICTIMS_{year}_.zip"
-        if not file_name.exists():
-            logger.info(f"Download year {year}.")
-            urllib.request.urlretrieve(
-                f"https://statbel.fgov.be/sites/default/files/files/opendata/Verkeersslachtoffers/TF_ACCIDENTS_VICTIMS_{year}.zip",
-                file_name)
-        casualties = pd.read_csv(file_name, compression='zip',
-                                 sep="|", low_memory=False)
         try:
-            casualties_clean = clean_casualties_data(casualties)
-            casualties_all.append(casualties_clean)
+            casualties = read_casualties_file(file_name)
+            casualties_all[year] = clean_casualties_data(casualties)
         except:
             logger.error(f"Data processing of year {year} failed")
     logger.info("All casualties raw data set donwloads ready.")
 
     logger.info("Combining individual years to single DataFrame.")
-    casualties_all = pd.concat(casualties_all).sort_values("datetime")
-
-    if 'n_victims_ok' in casualties_all.columns:
-        casualties = casualties_all[["datetime", "week_day",
-                    "n_victims", "n_victims_ok", "n_slightly_injured",
-                    "n_seriously_injured", "n_dead_30days",
-                    "road_user_type", "victim_type", "gender", "age",
-                    "road_type", "build_up_area", "light_conditions",
-                    "refnis_municipality", "municipality",
-                    "refnis_region", "region"
-                ]]
-    else:
-        casualties = casualties_all[["datetime", "week_day",
-                    "n_victims", "n_slightly_injured",
-                    "n_seriously_injured", "n_dead_30days",
-                    "road_user_type", "victim_type", "gender", "age",
-                    "road_type", "build_up_area", "light_conditions",
-                    "refnis_municipality", "municipality",
-                    "refnis_region", "region"
-                ]]
+    # a stable sort keeps the order of the years for equal datetimes,
+    # whatever the order in which the downloads completed
+    casualties_all = pd.concat(
+        [casualties_all[year] for year in sorted(casualties_all)]
+    ).sort_values("datetime", kind="stable")
+
+    # n_victims_ok is not available in all years
+    casualties = casualties_all[[col for col in CASUALTIES_OUTPUT_COLUMNS
+                                 if col in casualties_all.columns]]
 
     logger.info("Writing combined casualties data file to disk.")
     casualties.to_csv(Path("./data") / processed_file_name, index=False)
@@ -207,8 +745,6 @@ def main(start_year=2005, end_year=2020,
 
 if __name__ == "__main__":
 
-    logger = logging.getLogger(__name__)
-
     parser = argparse.ArgumentParser(
         description='Collect and prepare casualties open data Belgium.'
     )
@@ -216,9 +752,17 @@ if __name__ == "__main__":
                         help='First year to download casualties data.')
     parser.add_argument('end_year', metavar='end-year', type=int, default=20210,
                         help='Last year to download casualties data.')
+    parser.add_argument('--download-folder', default=None,
+                        help='Folder to keep the downloaded yearly files.')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of concurrent downloads.')
+    parser.add_argument('--partition-folder', default=None,
+                        help='Keep a partition per year and only process '
+                             'missing or changed years.')
 
     args = parser.parse_args()
 
     print("Start casualties data preparation...")
-    main(args.start_year, args.end_year)
+    main(args.start_year, args.end_year, download_folder=args.download_folder,
+         max_workers=args.workers, partition_folder=args.partition_folder)
     print("...done!")
\ No newline at end of file
@@ -0,0 +1,478 @@
+import argparse
+import json
+import logging
+import os
+import time
+import tracemalloc
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+
+from datetime_utils import datetime_from_parts
+from geo_utils import add_wgs84_coordinates
+
+
+logger = logging.getLogger(__name__)
+
+DATASET_NAME = "Ecological Archives E090-118-D1."
+
+SEX_MAPPING = {"M": "male",
+               "F": "female",
+               "R": "male",
+               "P": "female",
+               "Z": np.nan}
+
+
+def read_surveys(file_name, chunksize=None):
+    """Read the survey data, all at once or in chunks
+
+    Parameters
+    ----------
+    file_name : str
+        CSV file with the survey data.
+    chunksize : int, optional
+        Number of records per chunk, a single chunk by default.
+
+    Yields
+    ------
+    DataFrame
+        Chunk of the survey data.
+    """
+    if chunksize is None:
+        yield pd.read_csv(file_name)
+    else:
+        yield from pd.read_csv(file_name, chunksize=chunksize)
+
+
+def read_species(file_name):
+    """Read the species lookup table, with the species code 'NE' fixed"""
+    species_data = pd.read_csv(file_name, sep=";")
+    species_data.loc[species_data["species_id"] == "NE", "species_id"] = "NA"
+    return species_data
+
+
+def read_plots(file_name):
+    """Read the plot locations, with WGS84 coordinates"""
+    plot_data = pd.read_excel(file_name, skiprows=3, index_col=0)
+    plot_data = add_wgs84_coordinates(plot_data)
+    return plot_data[["plot", "decimalLongitude", "decimalLatitude"]]
+
+
+def solve_double_field_entry(df, keyword="and", column="verbatimEventDate"):
+    """Split on keyword in column for an enumeration and create extra record
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        DataFrame with a double field entry in one or more values
+    keyword: str
+        word/character to split the double records on
+    column: str
+        column name to use for the decoupling of the records
+    """
+    df = df.assign(**{column: df[column].str.split(keyword)})
+    df = df.explode(column)
+    df[column] = df[column].str.strip()  # remove white space around the words
+    return df
+
+
+def decode_sex(chunks, datasetname=DATASET_NAME):
+    """Add the dataset name and map the sex codes to 'male'/'female'"""
+    for chunk in chunks:
+        chunk["datasetName"] = datasetname
+        chunk = chunk.rename(columns={"sex_char": "verbatimSex"})
+        chunk["sex"] = chunk["verbatimSex"].replace(SEX_MAPPING)
+        yield chunk
+
+
+def split_double_entries(chunks, keyword="and", column="species"):
+    """Split the records with a double field entry in separate records"""
+    for chunk in chunks:
+        yield solve_double_field_entry(chunk, keyword, column=column)
+
+
+def add_occurrence_ids(chunks, start=1):
+    """Number the records sequentially over all chunks
+
+    The occurrenceID replaces the record_id of the surveys.
+    """
+    next_id = start
+    for chunk in chunks:
+        chunk["occurrenceID"] = np.arange(next_id, next_id + len(chunk))
+        next_id += len(chunk)
+        yield chunk.drop(columns="record_id")
+
+
+def repair_event_dates(chunks, replace_day=30):
+    """Combine the date parts to an eventDate, repairing invalid dates
+
+    Dates that do not exist (e.g. 31 April) get ``replace_day`` as day. The
+    dates are parsed a single time and only the invalid ones again.
+    """
+    for chunk in chunks:
+        dates = datetime_from_parts(chunk["year"], chunk["month"],
+                                    chunk["day"], errors="coerce")
+        invalid = dates.isna().to_numpy()
+        if invalid.any():
+            chunk.loc[invalid, "day"] = replace_day
+            dates[invalid] = datetime_from_parts(
+                chunk["year"][invalid], chunk["month"][invalid],
+                chunk["day"][invalid]).to_numpy()
+        chunk["eventDate"] = dates.dt.strftime('%Y-%m-%d')
+        yield chunk.drop(columns=["day", "month", "year"])
+
+
+def join_lookups(chunks, species_data, plot_data):
+    """Add the species names and the plot coordinates to each chunk"""
+    for chunk in chunks:
+        chunk = pd.merge(chunk, species_data, how="left",
+                         left_on="species", right_on="species_id")
+        chunk = chunk.drop(["species_x", "species_id"], axis=1)
+        chunk = chunk.rename(columns={"species_y": "species"})
+        chunk = pd.merge(chunk, plot_data, how="left", on="plot")
+        yield chunk.rename(columns={'plot': 'verbatimLocality'})
+
+
+def process_surveys(survey_file="./data/surveys.csv",
+                    species_file="./data/species.csv",
+                    plot_file="./data/plot_location.xlsx", chunksize=None):
+    """Survey records converted to occurrences, chunk by chunk
+
+    The processing steps of the case2 observations processing notebook as
+    a pipeline of generators. The lookup tables are read once and joined
+    to each chunk, so only a single chunk (and its intermediate results)
+    is in memory at the same time.
+
+    Parameters
+    ----------
+    survey_file : str
+        CSV file with the survey data.
+    species_file : str
+        CSV file with the genus and species names of the species codes.
+    plot_file : str
+        Excel file with the UTM coordinates of the plots.
+    chunksize : int, optional
+        Number of survey records per chunk, all at once by default.
+
+    Yields
+    ------
+    DataFrame
+        Processed chunk (``survey_data_plots`` of the notebook), with a
+        globally sequential 'occurrenceID'.
+    """
+    species_data = read_species(species_file)
+    plot_data = read_plots(plot_file)
+
+    chunks = read_surveys(survey_file, chunksize=chunksize)
+    chunks = decode_sex(chunks)
+    chunks = split_double_entries(chunks, "and", column="species")
+    chunks = add_occurrence_ids(chunks)
+    chunks = repair_event_dates(chunks)
+    yield from join_lookups(chunks, species_data, plot_data)
+
+
+def benchmark_process_surveys(survey_file="./data/surveys.csv",
+                              chunksizes=(None, 1000, 10000), **kwargs):
+    """Time and peak memory of the survey processing for chunk sizes
+
+    Parameters
+    ----------
+    survey_file : str
+        CSV file with the survey data.
+    chunksizes : tuple
+        Chunk sizes to compare, None processes the file at once.
+    **kwargs
+        Passed to :func:`process_surveys`.
+
+    Returns
+    -------
+    DataFrame
+        Duration in seconds and peak traced memory in MB per chunk size.
+    """
+    results = {}
+    for chunksize in chunksizes:
+        tracemalloc.start()
+        start = time.perf_counter()
+        n_records = 0
+        for chunk in process_surveys(survey_file, chunksize=chunksize,
+                                     **kwargs):
+            n_records += len(chunk)
+        duration = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        results[str(chunksize)] = {"records": n_records, "time": duration,
+                                   "peak_memory_mb": peak}
+        logger.info(f"Chunk size {chunksize}: {results[str(chunksize)]}")
+
+    return pd.DataFrame(results).transpose().rename_axis("chunksize")
+
+
+class RowHashIndex:
+    """Persistent index of row fingerprints to detect duplicate records
+
+    Every appended row is fingerprinted with a 64-bit hash of its key
+    columns. The distinct fingerprints are kept as sorted segments (a new
+    segment is merged with its predecessor when it is at least half as
+    large, a batch without new records adds no segment), so checking a
+    batch and adding it takes time proportional to the batch and not to the
+    history. The fingerprint and duplicate flag of each row are kept as
+    well, in order of appending, to select the duplicates of the full
+    table without hashing it again.
+
+    Parameters
+    ----------
+    folder : str or Path
+        Folder of the index, created when it does not exist.
+    columns : list of str, optional
+        Key columns that define a duplicate, by default all columns of the
+        first appended batch. Ignored for an existing index.
+
+    Notes
+    -----
+    Rows with the same fingerprint are considered equal, a hash collision
+    of two different rows is very unlikely (about 1 in 10**10 for a
+    million rows) and not checked.
+    """
+
+    def __init__(self, folder, columns=None):
+        self.folder = Path(folder)
+        meta_file = self.folder / "index.json"
+        if meta_file.exists():
+            self.meta = json.loads(meta_file.read_text())
+        else:
+            self.meta = {"columns": columns, "dtypes": None, "n_rows": 0,
+                         "segments": []}
+        self.segments = [np.load(self.folder / segment)
+                         for segment in self.meta["segments"]]
+
+    def __len__(self):
+        return self.meta["n_rows"]
+
+    @property
+    def columns(self):
+        return self.meta["columns"]
+
+    def fingerprints(self, batch):
+        """64-bit hash of the key columns of each row
+
+        The key columns are converted to the dtypes of the first batch, so
+        e.g. a batch with an empty text column hashes the same as the
+        history.
+        """
+        if self.meta["columns"] is None:
+            self.meta["columns"] = list(batch.columns)
+        keys = batch[self.columns]
+        if self.meta["dtypes"] is None:
+            self.meta["dtypes"] = {col: str(dtype)
+                                   for col, dtype in keys.dtypes.items()}
+        keys = keys.astype(self.meta["dtypes"])
+        return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+    def _contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for segment in self.segments:
+            position = np.searchsorted(segment, hashes).clip(max=len(segment) - 1)
+            found |= segment[position] == hashes
+        return found
+
+    def check(self, batch, keep="first"):
+        """Mark the duplicates of a batch, without adding it to the index
+
+        Parameters
+        ----------
+        batch : DataFrame
+            New records.
+        keep : {'first', False}, default 'first'
+            With 'first', the first occurrence of a record (in the history
+            or the batch) is not marked, with False all of them.
+
+        Returns
+        -------
+        ndarray of bool
+            True for the records of the batch that are a duplicate.
+        """
+        hashes = self.fingerprints(batch)
+        return self._contains(hashes) | pd.Series(hashes).duplicated(
+            keep=keep).to_numpy()
+
+    def append(self, batch):
+        """Add a batch of records to the index
+
+        Parameters
+        ----------
+        batch : DataFrame
+            New records, appended in order to the indexed table.
+
+        Returns
+        -------
+        ndarray of bool
+            True for the records of the batch that duplicate an earlier
+            record of the history or of the batch itself (as
+            ``duplicated(keep='first')``).
+        """
+        hashes = self.fingerprints(batch)
+        if len(batch) == 0:
+            return np.zeros(0, dtype=bool)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        duplicated = (self._contains(hashes)
+                      | pd.Series(hashes).duplicated().to_numpy())
+
+        # the per row data is appended, only the new records are written
+        with open(self.folder / "hashes.bin", "ab") as f:
+            hashes.astype(np.uint64).tofile(f)
+        with open(self.folder / "duplicated.bin", "ab") as f:
+            duplicated.astype(np.uint8).tofile(f)
+
+        # merge the smaller trailing segments, keeping a logarithmic number
+        segment = np.sort(hashes[~duplicated])
+        obsolete = []
+        # a batch of only duplicates adds no segment
+        while (len(segment) and self.segments
+               and len(self.segments[-1]) <= 2 * len(segment)):
+            segment = np.sort(np.concatenate([self.segments.pop(), segment]))
+            obsolete.append(self.meta["segments"].pop())
+        if len(segment):
+            segment_file = f"segment_{self.meta['n_rows'] + len(batch)}.npy"
+            np.save(self.folder / segment_file, segment)
+            self.segments.append(segment)
+            self.meta["segments"].append(segment_file)
+
+        self.meta["n_rows"] += len(batch)
+        temp_file = self.folder / "index.json.tmp"
+        temp_file.write_text(json.dumps(self.meta, indent=2))
+        os.replace(temp_file, self.folder / "index.json")
+        for segment_file in obsolete:
+            (self.folder / segment_file).unlink()
+        return duplicated
+
+    def duplicated(self, keep="first"):
+        """Mark the duplicates of all appended records, in order of appending
+
+        Parameters
+        ----------
+        keep : {'first', False}, default 'first'
+            With 'first', the first occurrence of a record is not marked,
+            with False all of them.
+
+        Returns
+        -------
+        ndarray of bool
+            Equivalent of ``DataFrame.duplicated(subset=columns, keep=keep)``
+            of the concatenated batches.
+        """
+        n_rows = self.meta["n_rows"]
+        duplicated = np.fromfile(self.folder / "duplicated.bin", dtype=np.uint8,
+                                 count=n_rows).astype(bool)
+        if keep == "first":
+            return duplicated
+        elif keep is False:
+            hashes = np.fromfile(self.folder / "hashes.bin", dtype=np.uint64,
+                                 count=n_rows)
+            return np.isin(hashes, hashes[duplicated])
+        raise ValueError("keep must be 'first' or False")
+
+
+def benchmark_row_hash_index(observations_file="./data/observations.csv",
+                             repeat_history=(1, 10), batch_size=1000):
+    """Time of checking a new batch against the index and the full table
+
+    Parameters
+    ----------
+    observations_file : str
+        CSV file with the observations.
+    repeat_history : tuple of int
+        Size of the history as a multiple of the observations.
+    batch_size : int, default 1000
+        Number of records appended.
+
+    Returns
+    -------
+    DataFrame
+        Duration in seconds of the index append and of ``duplicated`` of
+        the full concatenated table per history size.
+    """
+    observations = pd.read_csv(observations_file, index_col="occurrenceID")
+    batch = observations.sample(batch_size, random_state=0)
+
+    timings = {}
+    for n in repeat_history:
+        history = pd.concat([observations] * n)
+        with TemporaryDirectory() as folder:
+            index = RowHashIndex(folder)
+            index.append(history)
+            start = time.perf_counter()
+            duplicated = index.append(batch)
+            index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reference = pd.concat([history, batch]).duplicated()
+        full_time = time.perf_counter() - start
+        assert (duplicated == reference.to_numpy()[len(history):]).all()
+
+        timings[len(history)] = {"index": index_time, "full": full_time}
+        logger.info(f"History of {len(history)} records: {timings[len(history)]}")
+
+    return pd.DataFrame(timings).transpose().rename_axis("history")
+
+
+def main(survey_file="./data/surveys.csv", species_file="./data/species.csv",
+         plot_file="./data/plot_location.xlsx",
+         processed_file_name="./data/interim_survey_data_species.csv",
+         chunksize=10000):
+    """Process the survey data and write the occurrences to a CSV file
+
+    The output is the interim file of the case2 processing notebook
+    (``interim_survey_data_species.csv``), i.e. the records before the
+    GBIF species annotation. ``survey_data_completed.csv`` is obtained
+    by merging it with the annotation of :func:`gbif_utils.annotate_species`
+    on the genus and species columns, which needs the GBIF web service.
+
+    Parameters
+    ----------
+    survey_file : str
+        CSV file with the survey data.
+    species_file : str
+        CSV file with the genus and species names of the species codes.
+    plot_file : str
+        Excel file with the UTM coordinates of the plots.
+    processed_file_name : str
+        CSV file to write the processed (not yet annotated) records to.
+    chunksize : int, default 10000
+        Number of survey records processed at once.
+    """
+    logger.info("Start processing the survey data.")
+    chunks = process_surveys(survey_file, species_file, plot_file,
+                             chunksize=chunksize)
+    with open(processed_file_name, "w", newline="") as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=i == 0)
+    logger.info("Processed survey data file ready.")
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Convert the survey data to occurrences.'
+    )
+    parser.add_argument('--chunksize', type=int, default=10000,
+                        help='Number of survey records processed at once.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare time and memory for chunk sizes.')
+    parser.add_argument('--benchmark-index', action='store_true',
+                        help='Compare duplicate detection with the row '
+                             'hash index and on the full table.')
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(benchmark_process_surveys())
+    elif args.benchmark_index:
+        print(benchmark_row_hash_index())
+    else:
+        print("Start survey data preparation...")
+        main(chunksize=args.chunksize)
+        print("...done!")
@@ -0,0 +1,316 @@
+import argparse
+import logging
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+
+
+logger = logging.getLogger(__name__)
+
+
+def minmax_positions(y, buckets):
+    """Positions of the minimum and maximum of each bucket of values
+
+    The minimum and maximum of each bucket are kept, in their original
+    order. A bucket with only missing values keeps its first position, so
+    gaps in the data remain visible.
+
+    Parameters
+    ----------
+    y : ndarray
+        Values to downsample.
+    buckets : ndarray of int
+        Bucket number of each value, non-decreasing.
+
+    Returns
+    -------
+    ndarray of int
+        Sorted positions of the selected values.
+    """
+    n = len(y)
+    if n == 0:
+        return np.arange(0)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    positions = np.arange(n)
+
+    selected = []
+    for fill, reduce in [(np.inf, np.minimum), (-np.inf, np.maximum)]:
+        values = np.where(np.isnan(y), fill, y)
+        extreme = np.repeat(reduce.reduceat(values, starts), lengths)
+        # first position of the extreme value within each bucket
+        selected.append(np.minimum.reduceat(
+            np.where(values == extreme, positions, n), starts))
+    first, second = np.minimum(*selected), np.maximum(*selected)
+
+    result = np.column_stack([first, second]).ravel()
+    keep = np.ones(len(result), dtype=bool)
+    # a single point for a constant or empty bucket
+    keep[1::2] = second != first
+    return result[keep]
+
+
+def lttb_positions(x, y, n_out):
+    """Positions selected by the Largest-Triangle-Three-Buckets algorithm
+
+    Keeps the first and last point and, for each bucket in between, the
+    point that forms the largest triangle with the previously selected
+    point and the average of the next bucket. Missing values are skipped.
+
+    Parameters
+    ----------
+    x, y : ndarray
+        Coordinates of the points, sorted on x.
+    n_out : int
+        Number of points to select.
+
+    Returns
+    -------
+    ndarray of int
+        Sorted positions of the selected points.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if n <= n_out or n_out < 3:
+        return valid
+    x, y = x[valid].astype(np.float64), y[valid]
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + area.argmax()
+        selected[i + 1] = a
+    return valid[selected]
+
+
+def downsample_positions(x, y, n_out, method="minmax"):
+    """Positions of about ``n_out`` points that preserve the shape of a line
+
+    Parameters
+    ----------
+    x, y : ndarray
+        Coordinates of the points, sorted on x.
+    n_out : int
+        Number of points to keep, e.g. the width of the plot in pixels.
+    method : {'minmax', 'lttb'}, default 'minmax'
+        Minimum and maximum per bucket (``n_out / 2`` buckets of equal
+        width in x, keeps gaps and extremes) or Largest-Triangle-Three-
+        Buckets.
+
+    Returns
+    -------
+    ndarray of int
+    """
+    if method == "minmax":
+        if len(y) <= n_out:
+            return np.arange(len(y))
+        n_buckets = max(n_out // 2, 1)
+        span = x[-1] - x[0]
+        buckets = ((x - x[0]) * (n_buckets / span) if span > 0
+                   else np.zeros(len(x)))
+        return minmax_positions(y, buckets.astype(np.int64))
+    elif method == "lttb":
+        return lttb_positions(x, y, n_out)
+    raise ValueError("method must be 'minmax' or 'lttb'")
+
+
+class DownsamplePyramid:
+    """Precomputed downsampled levels of a series, to redraw on zoom
+
+    Level 0 contains all points, each next level about ``factor`` times
+    fewer, the minimum and maximum of buckets of the previous level (so
+    the extremes of any range are kept). A view is downsampled with
+    ``method`` from the coarsest level that still has enough points in the
+    visible range.
+
+    Parameters
+    ----------
+    x : ndarray of float
+        Sorted x coordinates (e.g. matplotlib date numbers).
+    y : ndarray of float
+        Values.
+    method : {'minmax', 'lttb'}, default 'minmax'
+        Downsampling method of a view, see :func:`downsample_positions`.
+    factor : int, default 4
+        Reduction of the number of points between consecutive levels.
+    min_points : int, default 4096
+        Number of points below which no coarser level is added.
+    """
+
+    def __init__(self, x, y, method="minmax", factor=4, min_points=4096):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.method = method
+        self.levels = [np.arange(len(self.y))]
+        while len(self.levels[-1]) > factor * min_points:
+            previous = self.levels[-1]
+            buckets = np.arange(len(previous)) // (2 * factor)
+            selected = minmax_positions(self.y[previous], buckets)
+            self.levels.append(previous[selected])
+
+    def positions(self, n_out, xmin=None, xmax=None):
+        """Positions of the points to draw for a view
+
+        Parameters
+        ----------
+        n_out : int
+            Number of points to draw, e.g. the width of the axes in pixels.
+        xmin, xmax : float, optional
+            Visible range, all data by default.
+
+        Returns
+        -------
+        ndarray of int
+            Positions in ``x`` and ``y``, including the points just outside
+            the view so the line continues to the edges.
+        """
+        for level in reversed(self.levels):
+            x = self.x[level]
+            start = max(np.searchsorted(x, xmin) - 1 if xmin is not None else 0, 0)
+            end = min(np.searchsorted(x, xmax, side="right") + 1
+                      if xmax is not None else len(x), len(x))
+            # enough points in view to downsample from, or the full data
+            if end - start >= 4 * n_out or level is self.levels[0]:
+                break
+        visible = level[start:end]
+        if len(visible) == 0:
+            return visible
+        selected = downsample_positions(self.x[visible], self.y[visible],
+                                        n_out, self.method)
+        # keep the outer points, so the line reaches the edges of the view
+        selected = np.union1d(selected, [0, len(visible) - 1])
+        return visible[selected]
+
+
+def _date_numbers(index):
+    if getattr(index, "tz", None) is not None:
+        # plot the local time, as pandas does
+        index = index.tz_localize(None)
+    return mdates.date2num(index.to_numpy())
+
+
+def plot_downsampled(data, ax=None, n_out=None, method="minmax", **kwargs):
+    """Line plot of a long time series, downsampled to the axes width
+
+    Each column is drawn with about as many points as the axes is wide in
+    pixels, and drawn again from a precomputed pyramid of downsampled
+    levels when the visible range changes (zooming or panning in an
+    interactive figure).
+
+    Parameters
+    ----------
+    data : Series or DataFrame
+        Values with a DatetimeIndex (timezone aware indexes are shown in
+        local time).
+    ax : matplotlib Axes, optional
+        Axes to plot in, a new figure by default.
+    n_out : int, optional
+        Number of points per line, by default the axes width in pixels.
+    method : {'minmax', 'lttb'}, default 'minmax'
+        Downsampling method, see :func:`downsample_positions`.
+    **kwargs
+        Passed to ``ax.plot`` for each line.
+
+    Returns
+    -------
+    ax : matplotlib Axes
+    """
+    if ax is None:
+        _, ax = plt.subplots()
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if n_out is None:
+        n_out = max(int(ax.get_window_extent().width), 100)
+
+    x = _date_numbers(data.index)
+    lines = []
+    for column in data.columns:
+        pyramid = DownsamplePyramid(x, data[column].to_numpy(dtype=np.float64),
+                                    method=method)
+        positions = pyramid.positions(n_out)
+        line, = ax.plot(x[positions], pyramid.y[positions], label=column,
+                        **kwargs)
+        lines.append((line, pyramid))
+    ax.xaxis_date()
+    if len(data.columns) > 1:
+        ax.legend()
+
+    def redraw(ax):
+        xmin, xmax = ax.get_xlim()
+        for line, pyramid in lines:
+            positions = pyramid.positions(n_out, xmin, xmax)
+            line.set_data(pyramid.x[positions], pyramid.y[positions])
+        ax.figure.canvas.draw_idle()
+
+    ax.callbacks.connect("xlim_changed", redraw)
+    return ax
+
+
+def benchmark_plot_downsampled(n_points=(10**5, 10**6, 3 * 10**6), repeat=1):
+    """Compare render time and peak memory with the pandas ``.plot()``
+
+    A random walk with a 5-minute DatetimeIndex is drawn on an Agg canvas,
+    the time includes creating the lines and rendering the figure.
+
+    Parameters
+    ----------
+    n_points : tuple of int
+        Length of the series.
+    repeat : int, default 1
+        Number of timings, the best is reported.
+
+    Returns
+    -------
+    DataFrame
+        Best time in seconds and peak traced memory in MB per approach and
+        series length (tracing memory slows down both approaches).
+    """
+    rng = np.random.default_rng(0)
+    results = {}
+    for n in n_points:
+        series = pd.Series(rng.standard_normal(n).cumsum(),
+                           index=pd.date_range("2000-01-01", periods=n,
+                                               freq="5min"))
+        for name, plot in [("raw", lambda ax: series.plot(ax=ax)),
+                           ("downsampled",
+                            lambda ax: plot_downsampled(series, ax=ax))]:
+            timings = []
+            for _ in range(repeat):
+                fig, ax = plt.subplots(figsize=(10, 6))
+                tracemalloc.start()
+                start = time.perf_counter()
+                plot(ax)
+                fig.canvas.draw()
+                timings.append(time.perf_counter() - start)
+                peak = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+                plt.close(fig)
+            results[(n, name)] = {"time": min(timings), "peak_memory_mb": peak}
+            logger.info(f"{n} points, {name}: {results[(n, name)]}")
+
+    return pd.DataFrame(results).transpose().rename_axis(["points", "plot"])
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the downsampled time series plot.'
+    )
+    parser.parse_args()
+
+    plt.switch_backend("Agg")
+    print(benchmark_plot_downsampled())
@@ -0,0 +1,292 @@
+import argparse
+import logging
+import os
+import time
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# bits per character in the integer key of a trigram (all unicode code points)
+CODE_BITS = 21
+
+
+def _codes(text):
+    """Unicode code points of a string"""
+    return np.frombuffer(text.encode("utf-32-le", errors="surrogatepass"),
+                         dtype=np.uint32).astype(np.int64)
+
+
+def _gram_keys(codes, positions):
+    """Integer keys of the trigrams starting at the positions"""
+    return ((codes[positions] << 2 * CODE_BITS)
+            | (codes[positions + 1] << CODE_BITS) | codes[positions + 2])
+
+
+class TrigramIndex:
+    """Substring and prefix index of a column of strings
+
+    For each trigram (three consecutive characters) the positions of the
+    strings containing it are stored. A ``contains`` query only verifies
+    the strings that contain all trigrams of the pattern, instead of
+    scanning all strings. A sorted order of the strings answers
+    ``startswith`` queries with a binary search. Missing values are
+    indexed as empty strings, as done in the notebook before filtering.
+
+    Parameters
+    ----------
+    strings : Series or array-like of str
+        Strings to index, e.g. ``titles['title']``.
+
+    Examples
+    --------
+    >>> index = TrigramIndex(titles['title'])
+    >>> titles.iloc[index.contains('Hamlet')]
+    >>> titles.iloc[index.startswith('The Life')]
+    """
+
+    def __init__(self, strings=None):
+        if strings is None:
+            return
+        values = pd.Series(strings).fillna("").astype(str).to_numpy(dtype=object)
+        self.values = values
+        self.lengths = np.fromiter(map(len, values), dtype=np.int64,
+                                   count=len(values))
+
+        codes = _codes("".join(values))
+        starts = np.cumsum(self.lengths) - self.lengths
+        # a string of length n has n - 2 trigrams, their start positions
+        # in the concatenated code points
+        n_grams = np.maximum(self.lengths - 2, 0)
+        first = np.cumsum(n_grams) - n_grams
+        positions = (np.arange(n_grams.sum())
+                     + np.repeat(starts - first, n_grams))
+        rows = np.repeat(np.arange(len(values), dtype=np.int32), n_grams)
+        keys = _gram_keys(codes, positions)
+
+        # rows are increasing, a stable sort keeps them sorted per trigram
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], rows[order]
+        unique = np.r_[True, (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])]
+        keys, self.postings = keys[unique], rows[unique]
+        self.grams, first = np.unique(keys, return_index=True)
+        self.offsets = np.r_[first, len(keys)]
+
+        self.sorted_positions = np.argsort(values, kind="stable")
+        self.sorted_values = values[self.sorted_positions]
+
+    def __len__(self):
+        return len(self.values)
+
+    def _posting(self, key):
+        i = np.searchsorted(self.grams, key)
+        if i == len(self.grams) or self.grams[i] != key:
+            return self.postings[:0]
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def candidates(self, pattern):
+        """Positions of the strings containing all trigrams of a pattern
+
+        Patterns shorter than three characters have no trigrams, then all
+        positions are candidates.
+        """
+        if len(pattern) < 3:
+            return np.arange(len(self))
+        codes = _codes(pattern)
+        keys = np.unique(_gram_keys(codes, np.arange(len(codes) - 2)))
+        postings = sorted((self._posting(key) for key in keys), key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            if len(result) == 0:
+                break
+            result = result[np.isin(result, posting, assume_unique=True)]
+        return result.astype(np.int64)
+
+    def contains(self, pattern):
+        """Positions of the strings containing a literal substring
+
+        Parameters
+        ----------
+        pattern : str
+            Substring to search (case sensitive, no regular expression).
+
+        Returns
+        -------
+        ndarray of int
+            Sorted positions, as
+            ``np.flatnonzero(strings.str.contains(pattern, regex=False))``.
+        """
+        candidates = self.candidates(pattern)
+        values = self.values
+        found = np.fromiter((pattern in values[i] for i in candidates),
+                            dtype=bool, count=len(candidates))
+        return candidates[found]
+
+    def startswith(self, prefix):
+        """Positions of the strings starting with a prefix
+
+        Parameters
+        ----------
+        prefix : str
+            Start of the strings (case sensitive).
+
+        Returns
+        -------
+        ndarray of int
+            Sorted positions, as
+            ``np.flatnonzero(strings.str.startswith(prefix))``.
+        """
+        if prefix == "":
+            return np.arange(len(self))
+        start = np.searchsorted(self.sorted_values, prefix, side="left")
+        if ord(prefix[-1]) < 0x10FFFF:
+            # the first string after all strings starting with the prefix
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            end = np.searchsorted(self.sorted_values, upper, side="left")
+        else:
+            end = start
+            while (end < len(self)
+                   and self.sorted_values[end].startswith(prefix)):
+                end += 1
+        return np.sort(self.sorted_positions[start:end])
+
+    def longest(self, n=10):
+        """Positions of the ``n`` longest strings, as ``str.len().nlargest(n)``"""
+        return pd.Series(self.lengths).nlargest(n).index.to_numpy()
+
+    def save(self, file_name):
+        """Store the index (including the strings) in a ``.npz`` file"""
+        encoded = [value.encode("utf-8", errors="surrogatepass")
+                   for value in self.values]
+        np.savez(file_name, grams=self.grams, offsets=self.offsets,
+                 postings=self.postings, sorted_positions=self.sorted_positions,
+                 lengths=self.lengths,
+                 text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                 text_offsets=np.cumsum([0] + [len(value) for value in encoded]))
+
+    @classmethod
+    def load(cls, file_name):
+        """Read an index stored with ``save``"""
+        index = cls()
+        with np.load(file_name) as data:
+            for name in ["grams", "offsets", "postings", "sorted_positions",
+                         "lengths"]:
+                setattr(index, name, data[name])
+            text, text_offsets = data["text"].tobytes(), data["text_offsets"]
+        values = np.empty(len(text_offsets) - 1, dtype=object)
+        values[:] = [text[start:end].decode("utf-8", errors="surrogatepass")
+                     for start, end in zip(text_offsets[:-1], text_offsets[1:])]
+        index.values = values
+        index.sorted_values = values[index.sorted_positions]
+        return index
+
+
+def synthetic_titles(n=250000, seed=0):
+    """Random movie-like titles, for when titles.csv is not downloaded
+
+    Titles of one to seven words, drawn with a Zipf-like frequency from a
+    vocabulary of common title words, names and random capitalized words.
+    """
+    rng = np.random.default_rng(seed)
+    common = ["The", "of", "a", "in", "and", "Life", "Love", "Man",
+              "Story", "Night", "King", "Return", "Last"]
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    random_words = ["".join(rng.choice(letters, size)).capitalize()
+                    for size in rng.integers(2, 10, 20000)]
+    # names are rare, as in the real titles
+    words = np.array(common + random_words[:500] + ["Hamlet", "Brian"]
+                     + random_words[500:])
+    frequency = 1 / np.arange(1, len(words) + 1)
+
+    n_words = rng.integers(1, 8, n)
+    choices = rng.choice(words, n_words.sum(), p=frequency / frequency.sum())
+    bounds = np.r_[0, np.cumsum(n_words)]
+    titles = [" ".join(choices[start:end])
+              for start, end in zip(bounds[:-1], bounds[1:])]
+    return pd.Series(titles, name="title")
+
+
+def benchmark_text_index(file_name="./data/titles.csv", repeat=3):
+    """Compare the index queries with the pandas string methods
+
+    The queries of the pandas_05 notebook are run on the title column,
+    with ``str.contains``, ``str.startswith`` and ``str.len().nlargest``
+    and with the index, and the positions are checked to be equal.
+
+    Parameters
+    ----------
+    file_name : str
+        The titles.csv file of the notebook. When it is not downloaded,
+        synthetic titles are used.
+    repeat : int, default 3
+        Number of timings, the best is reported.
+
+    Returns
+    -------
+    DataFrame
+        Best time in seconds per query for pandas and the index, with
+        the time to build, save and load the index.
+    """
+    if os.path.exists(file_name):
+        titles = pd.read_csv(file_name)["title"].fillna("")
+    else:
+        logger.warning(f"{file_name} not found, using synthetic titles.")
+        titles = synthetic_titles()
+
+    def best_time(function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    results = {"build": {"index": best_time(lambda: TrigramIndex(titles))}}
+    index = TrigramIndex(titles)
+    with TemporaryDirectory() as folder:
+        index_file = os.path.join(folder, "titles_index.npz")
+        results["save"] = {"index": best_time(lambda: index.save(index_file))}
+        results["load"] = {"index": best_time(
+            lambda: TrigramIndex.load(index_file))}
+        index = TrigramIndex.load(index_file)
+
+    queries = {
+        "contains 'Hamlet'": (
+            lambda: np.flatnonzero(titles.str.contains("Hamlet", regex=False)),
+            lambda: index.contains("Hamlet")),
+        "startswith 'Hamlet'": (
+            lambda: np.flatnonzero(titles.str.startswith("Hamlet")),
+            lambda: index.startswith("Hamlet")),
+        "startswith 'The Life'": (
+            lambda: np.flatnonzero(titles.str.startswith("The Life")),
+            lambda: index.startswith("The Life")),
+        "10 longest": (
+            lambda: titles.str.len().nlargest(10).index.to_numpy(),
+            lambda: index.longest(10)),
+    }
+    for query, (scan, lookup) in queries.items():
+        np.testing.assert_array_equal(lookup(), scan())
+        results[query] = {"pandas": best_time(scan),
+                          "index": best_time(lookup)}
+        logger.info(f"{query}: {results[query]}")
+    logger.info(f"{len(titles)} titles, {len(index.grams)} trigrams.")
+
+    return pd.DataFrame(results).transpose().rename_axis("query")
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the trigram index of the movie titles.'
+    )
+    parser.add_argument('--file', default="./data/titles.csv",
+                        help='The titles.csv file of the pandas_05 notebook.')
+
+    args = parser.parse_args()
+
+    print(benchmark_text_index(args.file))
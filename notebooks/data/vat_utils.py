@@ -0,0 +1,328 @@
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from tempfile import gettempdir
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+VAT_FILE = "./data/TF_VAT_NACE_SQ_2019.zip"
+
+FACT_TABLE = "TF_VAT_NACE_2019"
+
+# dimension tables and the key to join them on with the fact table
+DIMENSIONS = {
+    "TD_LGL_PSN_VAT": "CD_LGL_PSN_VAT",
+    "TD_NACE": "CD_NACE",
+    "TD_MUNTY_REFNIS": "CD_REFNIS",
+}
+
+# columns used in joins and filters
+INDEXES = {
+    FACT_TABLE: ["CD_REFNIS", "CD_LGL_PSN_VAT", "CD_NACE"],
+    **{table: [key] for table, key in DIMENSIONS.items()},
+}
+
+AGGREGATIONS = {"sum": "SUM", "mean": "AVG", "min": "MIN", "max": "MAX",
+                "count": "COUNT"}
+
+
+def file_checksum(file_name, chunk_size=2**20):
+    """SHA-256 checksum of the content of a file"""
+    checksum = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def extract_database(zip_file=VAT_FILE, cache_folder=None):
+    """Extract the SQLite database once, in a cache keyed by its content
+
+    The database is extracted in a subfolder named after the checksum of
+    the zip file, and the join keys (see ``INDEXES``) are indexed. When the
+    subfolder already exists, the cached database is used, so a changed
+    zip file is extracted again, while a renamed or copied one is not.
+
+    Parameters
+    ----------
+    zip_file : str
+        Zip archive with a single ``.sqlite`` file.
+    cache_folder : str, optional
+        Folder to cache the databases in, by default ``statbel_vat`` in the
+        temporary directory.
+
+    Returns
+    -------
+    Path
+        The indexed database file.
+    """
+    if cache_folder is None:
+        cache_folder = os.path.join(gettempdir(), "statbel_vat")
+    with zipfile.ZipFile(zip_file) as archive:
+        member, = [name for name in archive.namelist()
+                   if name.endswith(".sqlite")]
+        folder = Path(cache_folder) / file_checksum(zip_file)[:16]
+        database = folder / member
+        if database.exists():
+            logger.debug(f"Using the cached database {database}.")
+            return database
+
+        logger.info(f"Extracting {member} to {folder}.")
+        folder.mkdir(parents=True, exist_ok=True)
+        part_file = database.with_name(database.name + ".part")
+        with archive.open(member) as source, open(part_file, "wb") as target:
+            for chunk in iter(lambda: source.read(2**20), b""):
+                target.write(chunk)
+
+    with sqlite3.connect(part_file) as con:
+        for table, columns in INDEXES.items():
+            for column in columns:
+                con.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} "
+                            f"ON {table} ({column})")
+        con.execute("ANALYZE")
+    con.close()
+    # only a complete and indexed database gets the final name
+    os.replace(part_file, database)
+    return database
+
+
+def connect(zip_file=VAT_FILE, cache_folder=None):
+    """Read-only connection to the (cached) VAT database
+
+    Parameters
+    ----------
+    zip_file, cache_folder : str
+        See :func:`extract_database`.
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+    database = extract_database(zip_file, cache_folder)
+    return sqlite3.connect(f"{database.resolve().as_uri()}?mode=ro", uri=True)
+
+
+def _table_columns(con):
+    """Columns of the fact and dimension tables"""
+    return {table: [row[1] for row in con.execute(f"PRAGMA table_info({table})")]
+            for table in [FACT_TABLE, *DIMENSIONS]}
+
+
+def _from_clause(con, columns):
+    """Qualified column names and the joins needed to select ``columns``
+
+    A column of the fact table is taken from the fact table (also for the
+    join keys), other columns from the dimension table that contains them.
+    Only the dimension tables that are needed are joined.
+    """
+    tables = _table_columns(con)
+    qualified, joined = {}, []
+    for column in columns:
+        table = next((table for table, names in tables.items()
+                      if column in names), None)
+        if table is None:
+            raise KeyError(f"Column {column!r} is not present in the "
+                           f"{FACT_TABLE} table or its dimension tables.")
+        qualified[column] = f"{table}.{column}"
+        if table != FACT_TABLE and table not in joined:
+            joined.append(table)
+
+    sql = f"FROM {FACT_TABLE}"
+    for table in joined:
+        key = DIMENSIONS[table]
+        sql += (f" LEFT JOIN {table} "
+                f"ON {FACT_TABLE}.{key} = {table}.{key}")
+    return qualified, sql
+
+
+def _where_clause(qualified, where):
+    """Condition and parameters of filters on column values"""
+    conditions, parameters = [], []
+    for column, values in (where or {}).items():
+        if isinstance(values, (str, int, float)):
+            values = [values]
+        values = list(values)
+        placeholders = ", ".join("?" * len(values))
+        conditions.append(f"{qualified[column]} IN ({placeholders})")
+        parameters.extend(values)
+    sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return sql, parameters
+
+
+def select_vat(con, columns, where=None):
+    """Selected columns of the VAT data, joined with the dimension tables
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the VAT database, see :func:`connect`.
+    columns : list of str
+        Columns of the fact table and/or the dimension tables, e.g.
+        ``["CD_REFNIS", "TX_PROV_DESCR_EN", "MS_NUM_VAT"]``.
+    where : dict, optional
+        Values to keep per column, e.g.
+        ``{"TX_RGN_DESCR_EN": "Flanders region"}`` or a list of values.
+
+    Returns
+    -------
+    DataFrame
+        Equivalent to reading the full tables with ``pd.read_sql``, merging
+        them on their keys (left join) and selecting the rows and columns.
+    """
+    qualified, from_sql = _from_clause(con, [*columns, *(where or {})])
+    where_sql, parameters = _where_clause(qualified, where)
+    select = ", ".join(f"{qualified[column]} AS {column}" for column in columns)
+    sql = f"SELECT {select} {from_sql}{where_sql}"
+    logger.debug(sql)
+    return pd.read_sql(sql, con, params=parameters)
+
+
+def aggregate_vat(con, by, values=("MS_NUM_VAT", "MS_NUM_VAT_START",
+                                   "MS_NUM_VAT_STOP"),
+                  agg="sum", where=None, dropna=True):
+    """Aggregate the VAT numbers in the database, per group
+
+    The joins with the dimension tables and the aggregation are done by
+    SQLite, so only the aggregated table is read into pandas.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the VAT database, see :func:`connect`.
+    by : str or list of str
+        Columns to group by, e.g. 'TX_PROV_DESCR_EN' or 'CD_REFNIS'.
+    values : str or list of str
+        Columns to aggregate.
+    agg : {'sum', 'mean', 'min', 'max', 'count'}, default 'sum'
+        Aggregation, applied to each of the values columns.
+    where : dict, optional
+        Values to keep per column, see :func:`select_vat`.
+    dropna : bool, default True
+        Skip groups with a missing key (e.g. codes without a match in the
+        dimension table), as ``groupby`` does by default.
+
+    Returns
+    -------
+    DataFrame
+        Aggregated values with the group columns as (sorted) index, as
+        ``df.groupby(by)[values].agg(agg)`` on the merged tables.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    values = [values] if isinstance(values, str) else list(values)
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"agg must be one of {list(AGGREGATIONS)}")
+
+    qualified, from_sql = _from_clause(con, [*by, *values, *(where or {})])
+    where_sql, parameters = _where_clause(qualified, where)
+    if dropna:
+        not_null = " AND ".join(f"{qualified[column]} IS NOT NULL"
+                                for column in by)
+        where_sql = (f"{where_sql} AND {not_null}" if where_sql
+                     else f" WHERE {not_null}")
+    groups = ", ".join(qualified[column] for column in by)
+    select = ", ".join(
+        [f"{qualified[column]} AS {column}" for column in by]
+        + [f"{AGGREGATIONS[agg]}({qualified[column]}) AS {column}"
+           for column in values])
+    sql = (f"SELECT {select} {from_sql}{where_sql} "
+           f"GROUP BY {groups} ORDER BY {groups}")
+    logger.debug(sql)
+    return pd.read_sql(sql, con, params=parameters).set_index(by)
+
+
+def benchmark_aggregate_vat(zip_file=VAT_FILE, cache_folder=None, repeat=3):
+    """Compare the SQL aggregation with reading all tables and merging
+
+    The pandas approach is the one of the combining datasets notebook:
+    ``pd.read_sql("SELECT * ...")`` of the VAT table and the dimension
+    table, ``pd.merge`` and ``groupby``. The results are checked to be
+    equal.
+
+    Parameters
+    ----------
+    zip_file, cache_folder : str
+        See :func:`extract_database`.
+    repeat : int, default 3
+        Number of timings, the best is reported.
+
+    Returns
+    -------
+    DataFrame
+        Best time in seconds and peak traced memory in MB per query and
+        approach, including the first extraction and a cache hit.
+    """
+    results = {}
+    start = time.perf_counter()
+    extract_database(zip_file, cache_folder)
+    results[("extract", "sql")] = {"time": time.perf_counter() - start}
+    start = time.perf_counter()
+    con = connect(zip_file, cache_folder)
+    results[("connect (cached)", "sql")] = {"time": time.perf_counter() - start}
+
+    queries = {
+        "legal form": ("TD_LGL_PSN_VAT", "CD_LGL_PSN_VAT",
+                       "TX_LGL_PSN_VAT_EN_LVL1"),
+        "province": ("TD_MUNTY_REFNIS", "CD_REFNIS", "TX_PROV_DESCR_EN"),
+    }
+    for query, (table, key, by) in queries.items():
+        def read_and_merge():
+            df = pd.read_sql(f"SELECT * FROM {FACT_TABLE}", con)
+            df_dimension = pd.read_sql(f"SELECT * FROM {table}", con)
+            joined = pd.merge(df, df_dimension[[key, by]], on=key, how="left")
+            return joined.groupby(by)[["MS_NUM_VAT"]].sum()
+
+        def pushdown():
+            return aggregate_vat(con, by, "MS_NUM_VAT")
+
+        pd.testing.assert_frame_equal(pushdown(), read_and_merge())
+        for approach, function in [("pandas", read_and_merge),
+                                   ("sql", pushdown)]:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                function()
+                timings.append(time.perf_counter() - start)
+            tracemalloc.start()
+            function()
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+            results[(query, approach)] = {"time": min(timings),
+                                          "peak_memory_mb": peak}
+            logger.info(f"{query}, {approach}: {results[(query, approach)]}")
+    con.close()
+
+    return pd.DataFrame(results).transpose().rename_axis(["query", "approach"])
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Aggregate the statbel VAT numbers in the SQLite database.'
+    )
+    parser.add_argument('by', nargs='*', default=["TX_PROV_DESCR_EN"],
+                        help='Columns to group by.')
+    parser.add_argument('--file', default=VAT_FILE,
+                        help='Zip archive with the SQLite database.')
+    parser.add_argument('--cache-folder', default=None,
+                        help='Folder to extract the database in.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare with reading and merging all tables.')
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(benchmark_aggregate_vat(args.file, args.cache_folder))
+    else:
+        with connect(args.file, args.cache_folder) as con:
+            print(aggregate_vat(con, args.by))
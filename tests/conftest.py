@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+
+# the helper modules live next to the data of the notebooks
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "notebooks" / "data"))
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from airbase_analysis import (ExceedanceCounter, ProfileCube,
+                              check_exceedance_counter)
+
+
+def synthetic_hourly_data(seed, start="2010-12-20", periods=3 * 365 * 24,
+                          stations=("BETR801", "BETN029", "FR04037")):
+    """Hourly concentrations around the limit, with missing values"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq="h")
+    daily_cycle = np.sin(2 * np.pi * index.hour.to_numpy() / 24)[:, np.newaxis]
+    values = (80 + 30 * daily_cycle
+              + rng.normal(0, 15, (periods, len(stations))))
+    values[rng.random(values.shape) < 0.02] = np.nan
+    # a few longer gaps
+    for _ in range(5):
+        start_gap = rng.integers(0, periods - 100)
+        values[start_gap:start_gap + rng.integers(1, 100),
+               rng.integers(len(stations))] = np.nan
+    return pd.DataFrame(values, index=index, columns=list(stations))
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("batch_sizes", [(1, 7, 24, 1000), (23, 25), (5000,)])
+def test_exceedance_counter_random_batches(seed, batch_sizes):
+    data = synthetic_hourly_data(seed)
+    check_exceedance_counter(data, batch_sizes=batch_sizes, seed=seed)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_exceedance_counter_missing_hours(seed):
+    data = synthetic_hourly_data(seed, periods=400 * 24)
+    rng = np.random.default_rng(seed)
+    # hours missing from the index, within and in between batches
+    incomplete = data[rng.random(len(data)) > 0.05]
+
+    counter = ExceedanceCounter(data.columns)
+    bounds = np.sort(rng.choice(len(incomplete), 20, replace=False))
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(incomplete)]):
+        counter.update(incomplete.iloc[start:end])
+
+    regular = incomplete.asfreq("h")
+    expected = regular.rolling(8).mean().resample("D").max() > 100
+    expected = expected.groupby(expected.index.year).sum()
+    pd.testing.assert_frame_equal(counter.exceedances(), expected,
+                                  check_names=False)
+
+
+def test_exceedance_counter_rejects_overlap():
+    data = synthetic_hourly_data(0, periods=480)
+    counter = ExceedanceCounter(data.columns)
+    counter.update(data.iloc[:30])
+    with pytest.raises(ValueError):
+        counter.update(data.iloc[20:])
+
+
+def test_profile_cube_weekend_profile():
+    data = synthetic_hourly_data(0, periods=60 * 24)
+    cube = ProfileCube.from_data(data)
+
+    # case4 analysis: weekend as a boolean column, grouped with the hour
+    grouped = data.copy()
+    grouped["weekend"] = grouped.index.dayofweek.isin([5, 6])
+    grouped["hour"] = grouped.index.hour
+    expected = grouped.groupby(["weekend", "hour"]).mean()
+    pd.testing.assert_frame_equal(cube.profile(["weekend", "hour"]), expected,
+                                  check_index_type=False)
+
+
+@pytest.mark.parametrize("last_timestamp", [None, pd.Timestamp("2011-02-17 23:00")])
+def test_profile_cube_save_load(tmp_path, last_timestamp):
+    data = synthetic_hourly_data(1, periods=60 * 24)
+    cube = ProfileCube.from_data(data)
+    cube.last_timestamp = last_timestamp
+    cube.save(tmp_path / "profiles.npz")
+
+    loaded = ProfileCube.load(tmp_path / "profiles.npz")
+    assert loaded.last_timestamp == last_timestamp
+    pd.testing.assert_frame_equal(loaded.profile("month"), cube.profile("month"))
+
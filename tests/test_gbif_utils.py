@@ -0,0 +1,120 @@
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+import requests
+
+from gbif_utils import NameMatchCache, annotate_species, name_match_many
+
+
+FAILING_NAME = "Failing name"
+
+
+class MockGBIFHandler(BaseHTTPRequestHandler):
+    """Stand-in for the GBIF species match service"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        name = query["name"][0]
+        self.server.requests[name] += 1
+        if name == FAILING_NAME:
+            status, message = 500, {"error": "internal server error"}
+        else:
+            status, message = 200, {"scientificName": name,
+                                    "usageKey": len(name),
+                                    "strict": query["strict"][0]}
+        body = json.dumps(message).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def gbif_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockGBIFHandler)
+    server.requests = Counter()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}/v1/species/match"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_name_match_many(gbif_server):
+    names = ["Callipepla squamata", "Dipodomys merriami", "Callipepla squamata"]
+    messages = name_match_many(names, url=gbif_server.url)
+    assert list(messages) == ["Callipepla squamata", "Dipodomys merriami"]
+    assert messages["Dipodomys merriami"]["scientificName"] == "Dipodomys merriami"
+    # duplicate names are requested once
+    assert gbif_server.requests["Callipepla squamata"] == 1
+
+
+def test_name_match_cache_hits(gbif_server, tmp_path):
+    cache_file = tmp_path / "cache.json"
+    names = ["Callipepla squamata", "Dipodomys merriami"]
+    first = name_match_many(names, cache_file=cache_file, url=gbif_server.url)
+    second = name_match_many(names, cache_file=cache_file, url=gbif_server.url)
+    assert first == second
+    assert sum(gbif_server.requests.values()) == 2
+
+    # the strict option is part of the key
+    name_match_many(names, strict=False, cache_file=cache_file,
+                    url=gbif_server.url)
+    assert sum(gbif_server.requests.values()) == 4
+
+
+def test_name_match_cache_expiry(gbif_server, tmp_path):
+    cache_file = tmp_path / "cache.json"
+    names = ["Callipepla squamata", "Dipodomys merriami"]
+    name_match_many(names, cache_file=cache_file, url=gbif_server.url)
+
+    # make one entry older than the time to live
+    cache = NameMatchCache(cache_file)
+    cache.entries["Dipodomys merriami|True"]["time"] -= 3600
+    cache.save()
+    assert NameMatchCache(cache_file, ttl=60).get("Dipodomys merriami", True) is None
+
+    name_match_many(names, cache_file=cache_file, ttl=60, url=gbif_server.url)
+    assert gbif_server.requests == {"Callipepla squamata": 1,
+                                    "Dipodomys merriami": 2}
+
+
+def test_name_match_failing_name(gbif_server, tmp_path):
+    cache_file = tmp_path / "cache.json"
+    names = ["Callipepla squamata", FAILING_NAME, "Dipodomys merriami"]
+    with pytest.raises(requests.HTTPError):
+        name_match_many(names, cache_file=cache_file, url=gbif_server.url)
+
+    # the successful names are cached anyway
+    cache = NameMatchCache(cache_file)
+    assert cache.get("Callipepla squamata", True) is not None
+    assert cache.get("Dipodomys merriami", True) is not None
+    assert cache.get(FAILING_NAME, True) is None
+
+    messages = name_match_many(names, cache_file=cache_file,
+                               url=gbif_server.url, errors="ignore")
+    assert messages[FAILING_NAME] is None
+    assert gbif_server.requests == {"Callipepla squamata": 1,
+                                    "Dipodomys merriami": 1,
+                                    FAILING_NAME: 2}
+
+
+def test_annotate_species_failing_name(gbif_server):
+    species = pd.DataFrame({"genus": ["Callipepla", "Failing"],
+                            "species": ["squamata", "name"]}, index=[3, 7])
+    annotated = annotate_species(species, url=gbif_server.url, errors="ignore")
+    assert list(annotated.index) == [3, 7]
+    assert annotated.loc[3, "scientificName"] == "Callipepla squamata"
+    assert annotated.loc[7].isna().all()
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from load_bike_counts import (DIRECTIONS, PROFILES, RESOLUTIONS,
+                              BikeCountRollups)
+
+
+TIMEZONE = "Europe/Brussels"
+
+
+def synthetic_counts(seed=0, start="2023-03-20", end="2023-11-05"):
+    """5-minute counts in UTC, across both DST transitions of 2023"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, end, freq="5min", tz="UTC",
+                          inclusive="left", name="timestamp")
+    return pd.DataFrame(rng.integers(0, 20, (len(index), len(DIRECTIONS))),
+                        index=index, columns=DIRECTIONS)
+
+
+@pytest.fixture(scope="module")
+def counts():
+    return synthetic_counts()
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_rollups_random_batches(counts, seed):
+    rng = np.random.default_rng(seed)
+    splits = np.sort(rng.choice(np.arange(1, len(counts)), 6, replace=False))
+    rollups = BikeCountRollups()
+    for start, end in zip([0, *splits], [*splits, len(counts)]):
+        rollups.update(counts.iloc[start:end])
+
+    local = counts.tz_convert(TIMEZONE)
+    for resolution, rule in RESOLUTIONS.items():
+        pd.testing.assert_frame_equal(rollups.rollup(resolution),
+                                      local.resample(rule).sum(),
+                                      check_freq=False)
+    for by, resolution in PROFILES.items():
+        table = local.resample(RESOLUTIONS[resolution]).sum()
+        pd.testing.assert_frame_equal(
+            rollups.profile(by), table.groupby(getattr(table.index, by)).mean())
+
+
+@pytest.mark.parametrize("day, n_hours", [("2023-03-26", 23),
+                                          ("2023-10-29", 25),
+                                          ("2023-10-28", 24)])
+def test_rollups_dst_days(counts, day, n_hours):
+    rollups = BikeCountRollups.from_counts(counts)
+    hourly = rollups.rollup("hourly", day, day)
+    assert len(hourly) == n_hours
+
+    # the local calendar day, as an interval in UTC
+    midnight = pd.Timestamp(day).tz_localize(TIMEZONE)
+    next_midnight = (pd.Timestamp(day) + pd.Timedelta(days=1)).tz_localize(TIMEZONE)
+    assert next_midnight - midnight == pd.Timedelta(hours=n_hours)
+    expected = counts[(counts.index >= midnight) & (counts.index < next_midnight)]
+    assert len(expected) == n_hours * 12
+    pd.testing.assert_series_equal(rollups.rollup("daily").loc[midnight],
+                                   expected.sum(), check_names=False)
+    pd.testing.assert_series_equal(hourly.sum(), expected.sum())
+
+
+def test_rollups_repeated_october_hour(counts):
+    hourly = BikeCountRollups.from_counts(counts).rollup("hourly")
+    repeated = hourly[hourly.index.strftime("%Y-%m-%d %H") == "2023-10-29 02"]
+    # once for summer time and once for winter time
+    assert [str(timestamp.utcoffset()) for timestamp in repeated.index] == [
+        "2:00:00", "1:00:00"]
+    utc = counts.loc["2023-10-29 00:00":"2023-10-29 01:55"]
+    pd.testing.assert_frame_equal(
+        repeated, utc.resample("h").sum().tz_convert(TIMEZONE),
+        check_freq=False, check_names=False)
+
+
+def test_rollups_reject_tz_naive(counts):
+    with pytest.raises(ValueError, match="timezone aware"):
+        BikeCountRollups().update(counts.tz_localize(None))
+
+
+def test_rollups_save_load(counts, tmp_path):
+    BikeCountRollups().save(tmp_path / "empty")
+    assert BikeCountRollups.load(tmp_path / "empty").last_timestamp is None
+
+    rollups = BikeCountRollups.from_counts(counts.iloc[:5000])
+    rollups.save(tmp_path / "rollups")
+    loaded = BikeCountRollups.load(tmp_path / "rollups")
+    assert loaded.last_timestamp == counts.index[4999]
+    loaded.update(counts)
+    pd.testing.assert_frame_equal(
+        loaded.rollup("daily"),
+        BikeCountRollups.from_counts(counts).rollup("daily"), check_freq=False)
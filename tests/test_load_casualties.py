@@ -0,0 +1,458 @@
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from load_casualties import (CASUALTIES_OUTPUT_COLUMNS, TRANSLATIONS,
+                             DownloadManifest, benchmark_clean_casualties_data,
+                             clean_casualties_data, download_file, main,
+                             merge_sorted_partitions, read_casualties_file,
+                             recode_categories, update_partitions)
+
+
+DATA_FOLDER = Path(__file__).resolve().parents[1] / "notebooks" / "data"
+
+
+@pytest.fixture(scope="module")
+def raw_text():
+    """First records of the bundled 2020 file, all values as text"""
+    return pd.read_csv(DATA_FOLDER / "TF_ACCIDENTS_VICTIMS_2020.zip",
+                       compression="zip", sep="|", nrows=200, dtype=str,
+                       keep_default_na=False)
+
+
+def write_raw_file(raw_text, file_name):
+    """Write records in the format of the statbel zip files"""
+    raw_text.to_csv(file_name, sep="|", index=False,
+                    compression={"method": "zip",
+                                 "archive_name": f"{Path(file_name).stem}.txt"})
+    return file_name
+
+
+def clean_casualties_data_replace(casualties_raw):
+    """The replace() based cleaning that clean_casualties_data replaced
+
+    Applied to the raw data read with the default dtypes.
+    """
+    casualties = (
+        casualties_raw
+        .drop(columns=[col for col in casualties_raw.columns
+                        if col.endswith("_FR")])
+        .drop(columns=[col for col in casualties_raw.columns
+                        if col.startswith("CD_") and not col.endswith("_REFNIS")])
+        .rename(columns={name: name.removeprefix("TX_").removesuffix("_DESCR_NL")
+                        for name in casualties_raw.columns})
+        .replace("Onbekend", None)
+    )
+    casualties["gender"] = casualties["SEX"].replace(
+        {"Vrouwelijk": "female", "Mannelijk": "male"}
+    )
+
+    casualties["DT_HOUR"] = casualties["DT_HOUR"].replace(99, 0)
+    casualties["datetime"] = pd.to_datetime(
+        casualties["DT_DAY"] + " " + casualties["DT_HOUR"].astype(str) + ":00"
+    )
+
+    casualties["age"] = casualties["AGE_CLS"].str.replace(
+        " tot ", " - ").str.removesuffix("jaar").str.strip()
+    casualties["age"] = casualties["age"].replace(
+        {"": None, "75 jaar en meer": ">75", ' ': None})
+
+    casualties["DAY_OF_WEEK"] = casualties["DAY_OF_WEEK"].replace({
+        "maandag": "Monday", "dinsdag": "Tuesday", "woensdag": "Wednesday",
+        "donderdag": "Thursday", "vrijdag": "Friday", "zaterdag": "Saturday",
+        "zondag": "Sunday"})
+    casualties["week_day"] = pd.Categorical(
+        casualties["DAY_OF_WEEK"],
+        categories=["Monday", "Tuesday", "Wednesday",
+                    "Thursday", "Friday", "Saturday", "Sunday"],
+        ordered=True
+    )
+
+    casualties["victim_type"] = casualties["VICT_TYPE"].replace({
+        "Bestuurder": "Driver", "Bromfietser": "Moped driver",
+        "Passagier": "Passenger", "Motorfietser": 'Motorcyclist',
+        "Fietser": "Cyclist", "Voetganger": "Pedestrian",
+        "Autres victimes": None})
+
+    casualties["build_up_area"] = casualties["BUILD_UP_AREA"].replace({
+        "Binnen bebouwde kom": "Inside built-up area",
+        "Buiten bebouwde kom": "Outside built-up area",
+        " ": None})
+
+    casualties["ROAD_USR_TYPE"] = casualties["ROAD_USR_TYPE"].replace({
+        'Personenauto': 'Passenger car',
+        'Auto voor dubbel gebruik': 'Dual-purpose vehicle',
+        'Lichte vrachtauto': 'Light truck',
+        'Bromfiets': 'Moped',
+        'Bromfiets A (tweewielige)': 'Moped',
+        'Bromfiets B (tweewielige)': 'Moped',
+        'Bromfiets met 3 of 4 wielen': 'Moped',
+        'Motorfiets': 'Motorbike',
+        'Motorfiets meer dan 400 cc': 'Motorbike',
+        'Motorfiets niet meer dan 400 cc': 'Motorbike',
+        'Fiets': 'Bicycle',
+        'Elektrische fiets': 'Electric bicycle',
+        'Fiets met elektrische hulpmotor (<=250W en <=25km/u)': 'Electric bicycle',
+        'Gemotoriseerde fiets (<=1000W en <=25km/u)': 'Electric bicycle',
+        'Speed pedelec (<= 4000W en <=45km/u)': 'Speed pedelec',
+        'Gemotoriseerd voortbewegingstoestel (<=18km/u)': 'Electric bicycle',
+        'Trekker + aanhangwagen': 'Trailer',
+        'Trekker alleen': 'Trailer',
+        'Vrachtwagen': 'Truck',
+        'Ruiter': 'Horse rider',
+        'Bespannen voertuig': 'Horse rider',
+        'Andere voetganger': 'Pedestrian',
+        'Gehandicapte in rolstoel': 'Disabled person in a wheelchair',
+        'Voetganger die zijn (brom)fiets duwt': 'Pedestrian',
+        'Trolleybus, Tram': 'Tram',
+        'Minibus': 'Van',
+        'Autobus': 'Bus',
+        'Autocar': 'Bus',
+        'Autobus/Autocar': 'Bus',
+        'Kampeerwagen': 'Campervan',
+        'Landbouwtractor': 'Tractor',
+        'Andere weggebruiker': None,
+        'Niet ingevuld': None,
+        np.nan: None
+    })
+
+    casualties["LIGHT_COND"] = casualties["LIGHT_COND"].replace(
+        {'Bij klaarlichte dag': 'In broad daylight',
+         'Nacht, ontstoken openbare verlichting': 'Night, public lighting lit',
+         'Dageraad - schemering': 'Dawn',
+         'Nacht, openbare verlichting aanwezig, maar niet ontstoken': 'Night, no public lighting',
+         'Nacht, geen openbare verlichting': 'Night, no public lighting',
+         ' ': None
+        })
+
+    casualties["ROAD_TYPE"] = casualties["ROAD_TYPE"].replace({
+        'Gemeenteweg': 'Municipal road',
+        'Gewestweg': 'Regional road',
+        'Autosnelweg': 'Motorway'
+    })
+
+    casualties["RGN"] = casualties["RGN"].replace({
+        'Vlaams Gewest': 'Flemish Region',
+        'Brussels Hoofdstedelijk Gewest': 'Brussels-Capital Region',
+        'Waals Gewest': 'Walloon Region'
+    })
+    casualties["CD_RGN_REFNIS"] = casualties["CD_RGN_REFNIS"].replace(
+        {'02000': 2000, '03000': 3000, '04000': 4000, ' ': None}
+    )
+
+    casualties = casualties.replace(" ", None)
+    casualties = casualties.rename(columns={
+        "MS_VICT": "n_victims",
+        "MS_VIC_OK": "n_victims_ok",
+        "MS_SLY_INJ": "n_slightly_injured",
+        "MS_SERLY_INJ": "n_seriously_injured",
+        "MS_DEAD_30_DAYS": "n_dead_30days",
+        "ROAD_USR_TYPE": "road_user_type",
+        "LIGHT_COND": "light_conditions",
+        "ROAD_TYPE": "road_type",
+        "RGN": "region",
+        "CD_RGN_REFNIS": "refnis_region",
+        "CD_MUNTY_REFNIS": "refnis_municipality",
+        "MUNTY": "municipality"
+    })
+    casualties_clean = casualties.drop(
+        columns=[
+            "DT_DAY", "DT_HOUR", "DAY_OF_WEEK", "SEX", "VICT_TYPE",
+            "BUILD_UP_AREA", "AGE_CLS", "CD_PROV_REFNIS", "PROV",
+            "CD_DSTR_REFNIS", "ADM_DSTR"],
+        errors="ignore"
+    )
+
+    return casualties_clean
+
+
+def replace_reference(casualties_raw):
+    with warnings.catch_warnings():
+        # replace() downcasting deprecation
+        warnings.simplefilter("ignore", FutureWarning)
+        return clean_casualties_data_replace(casualties_raw)
+
+
+def test_read_casualties_file_empty_integers(raw_text, tmp_path):
+    raw_text = raw_text.copy()
+    raw_text.loc[3, "DT_HOUR"] = ""
+    raw_text.loc[5, "MS_VICT"] = ""
+    file_name = write_raw_file(raw_text, tmp_path / "TF_ACCIDENTS_VICTIMS_2020.zip")
+
+    casualties_raw = read_casualties_file(file_name)
+    assert casualties_raw["DT_HOUR"].isna().sum() == 1
+    assert casualties_raw["MS_VICT"].isna().sum() == 1
+
+    casualties = clean_casualties_data(casualties_raw)
+    assert pd.isna(casualties.loc[3, "datetime"])
+    assert pd.isna(casualties.loc[5, "n_victims"])
+    # unknown hours (99) are midnight
+    expected = (pd.to_datetime(raw_text.loc[4, "DT_DAY"])
+                + pd.Timedelta(hours=int(raw_text.loc[4, "DT_HOUR"]) % 99))
+    assert casualties.loc[4, "datetime"] == expected
+    np.testing.assert_array_equal(
+        casualties["n_victims"].drop(5).to_numpy(dtype=np.int64),
+        raw_text["MS_VICT"].drop(5).astype(np.int64))
+
+
+def test_clean_casualties_data_equals_replace_reference(raw_text, tmp_path):
+    raw_text = raw_text.copy()
+    raw_text.loc[7, "TX_SEX_DESCR_NL"] = "Onbekend"
+    raw_text.loc[8, "TX_LIGHT_COND_DESCR_NL"] = " "
+    file_name = write_raw_file(raw_text, tmp_path / "TF_ACCIDENTS_VICTIMS_2020.zip")
+
+    casualties = clean_casualties_data(read_casualties_file(file_name))
+    reference = replace_reference(pd.read_csv(file_name, compression="zip",
+                                              sep="|", low_memory=False))
+    assert pd.isna(casualties.loc[7, "gender"])
+    assert pd.isna(casualties.loc[8, "light_conditions"])
+    # the values are equal, the dtypes differ (categoricals, nullable ints)
+    pd.testing.assert_frame_equal(
+        casualties[CASUALTIES_OUTPUT_COLUMNS].astype(object).replace({np.nan: None}),
+        reference[CASUALTIES_OUTPUT_COLUMNS].astype(object).replace({np.nan: None}))
+
+
+@pytest.mark.parametrize("column", ["ROAD_USR_TYPE", "VICT_TYPE"])
+def test_recode_categories_equals_replace(column):
+    mapping = next(mapping for label_column, mapping in TRANSLATIONS.values()
+                   if label_column == column)
+    labels = list(mapping) + ["Not translated", None]
+    values = pd.Series(labels * 3, name=column)
+
+    recoded = recode_categories(values, mapping)
+    # labels translated to the same value share a category
+    assert recoded.cat.categories.is_unique
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        expected = values.replace(mapping)
+    pd.testing.assert_series_equal(
+        recoded.astype(object).replace({np.nan: None}),
+        expected.astype(object).replace({np.nan: None}))
+
+
+def test_benchmark_clean_casualties_data(raw_text, tmp_path):
+    file_name = write_raw_file(raw_text, tmp_path / "TF_ACCIDENTS_VICTIMS_2020.zip")
+    results = benchmark_clean_casualties_data(file_name, n_years=(1, 2))
+    assert list(results.columns) == ["rows", "categories"]
+
+    # the benchmark asserts equal output of both cleaning approaches
+    results = benchmark_clean_casualties_data(
+        file_name, reference=replace_reference, n_years=(1, 2))
+    assert list(results["rows"]) == [len(raw_text), 2 * len(raw_text)]
+    assert list(results.columns) == ["rows", "categories", "reference"]
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Static file server supporting single byte range requests"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        name = self.path.lstrip("/")
+        byte_range = self.headers.get("Range")
+        self.server.requests.append((name, byte_range))
+        time.sleep(self.server.delays.get(name, 0))
+        content = self.server.files.get(name)
+        if content is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if byte_range is None:
+            self.send_response(200)
+            body = content
+        else:
+            start = int(byte_range.removeprefix("bytes=").split("-")[0])
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range",
+                             f"bytes {start}-{len(content) - 1}/{len(content)}")
+            body = content[start:]
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    server.files, server.delays, server.requests = {}, {}, []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def content():
+    return np.random.default_rng(0).bytes(300000)
+
+
+def test_download_file(file_server, content, tmp_path):
+    file_server.files["data.zip"] = content
+    manifest = DownloadManifest(tmp_path / "manifest.json")
+    with requests.Session() as session:
+        file_name = download_file(session, f"{file_server.url}/data.zip",
+                                  tmp_path / "data.zip", manifest)
+        assert file_name.read_bytes() == content
+        assert DownloadManifest(tmp_path / "manifest.json").verify(file_name)
+
+        # a verified file is not downloaded again
+        download_file(session, f"{file_server.url}/data.zip",
+                      tmp_path / "data.zip", manifest)
+    assert file_server.requests == [("data.zip", None)]
+
+
+def test_download_file_resume(file_server, content, tmp_path):
+    file_server.files["data.zip"] = content
+    (tmp_path / "data.zip.part").write_bytes(content[:120000])
+    manifest = DownloadManifest(tmp_path / "manifest.json")
+    with requests.Session() as session:
+        file_name = download_file(session, f"{file_server.url}/data.zip",
+                                  tmp_path / "data.zip", manifest, chunk_size=4096)
+    assert file_name.read_bytes() == content
+    assert not (tmp_path / "data.zip.part").exists()
+    assert file_server.requests == [("data.zip", "bytes=120000-")]
+    assert manifest.verify(file_name)
+
+
+def test_download_file_range_not_satisfiable(file_server, content, tmp_path):
+    file_server.files["data.zip"] = content
+    # a partial file larger than the remote file (e.g. the file changed)
+    (tmp_path / "data.zip.part").write_bytes(content + b"outdated")
+    manifest = DownloadManifest(tmp_path / "manifest.json")
+    with requests.Session() as session:
+        file_name = download_file(session, f"{file_server.url}/data.zip",
+                                  tmp_path / "data.zip", manifest)
+    assert file_name.read_bytes() == content
+    assert file_server.requests == [("data.zip", f"bytes={len(content) + 8}-"),
+                                    ("data.zip", None)]
+
+
+@pytest.mark.parametrize("damage", ["truncated", "modified", "unknown"])
+def test_download_file_mismatch_manifest(file_server, content, tmp_path, damage):
+    file_server.files["data.zip"] = content
+    manifest = DownloadManifest(tmp_path / "manifest.json")
+    url = f"{file_server.url}/data.zip"
+    with requests.Session() as session:
+        file_name = download_file(session, url, tmp_path / "data.zip", manifest)
+        if damage == "truncated":
+            file_name.write_bytes(content[:1000])
+        elif damage == "modified":
+            file_name.write_bytes(content[:-1] + b"x")
+        else:
+            manifest.entries.clear()
+        download_file(session, url, tmp_path / "data.zip", manifest)
+    assert file_name.read_bytes() == content
+    assert file_server.requests == [("data.zip", None), ("data.zip", None)]
+
+
+def test_main_concatenates_years_in_order(file_server, raw_text, tmp_path,
+                                          monkeypatch):
+    years = [2018, 2019, 2020]
+    (tmp_path / "source").mkdir()
+    for year in years:
+        # same records each year, marked with the year as municipality code
+        name = f"TF_ACCIDENTS_VICTIMS_{year}.zip"
+        file_name = write_raw_file(raw_text.assign(CD_MUNTY_REFNIS=str(year)),
+                                   tmp_path / "source" / name)
+        file_server.files[name] = file_name.read_bytes()
+        # the downloads complete in reverse order
+        file_server.delays[name] = 0.1 * (2020 - year)
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    main(2018, 2020, processed_file_name="casualties.csv",
+         download_folder=tmp_path / "downloads",
+         url_template=f"{file_server.url}/TF_ACCIDENTS_VICTIMS_{{year}}.zip")
+
+    expected = pd.concat([
+        clean_casualties_data(read_casualties_file(
+            tmp_path / "source" / f"TF_ACCIDENTS_VICTIMS_{year}.zip"))
+        for year in years]).sort_values("datetime", kind="stable")
+    expected = expected[[col for col in CASUALTIES_OUTPUT_COLUMNS
+                         if col in expected.columns]]
+    expected.to_csv(tmp_path / "expected.csv", index=False)
+    assert ((tmp_path / "data" / "casualties.csv").read_text()
+            == (tmp_path / "expected.csv").read_text())
+
+    casualties = pd.read_csv(tmp_path / "data" / "casualties.csv")
+    assert len(casualties) == 3 * len(raw_text)
+    # equal datetimes keep the order of the years
+    assert casualties.groupby("datetime")["refnis_municipality"].apply(
+        lambda codes: codes.is_monotonic_increasing).all()
+
+
+@pytest.fixture
+def yearly_files(file_server, raw_text, tmp_path):
+    """Served yearly files with equal datetimes and unknown hours"""
+    years = [2018, 2019, 2020]
+    (tmp_path / "source").mkdir()
+    for year in years:
+        raw_year = raw_text.assign(CD_MUNTY_REFNIS=str(year))
+        # unknown hours give missing datetimes
+        raw_year.loc[[2, 50 + year % 10, 150], "DT_HOUR"] = ""
+        name = f"TF_ACCIDENTS_VICTIMS_{year}.zip"
+        file_name = write_raw_file(raw_year, tmp_path / "source" / name)
+        file_server.files[name] = file_name.read_bytes()
+    return years, f"{file_server.url}/TF_ACCIDENTS_VICTIMS_{{year}}.zip"
+
+
+@pytest.mark.parametrize("batch_size", [7, 64, 1000])
+def test_merge_sorted_partitions(yearly_files, tmp_path, batch_size):
+    years, url_template = yearly_files
+    partitions = update_partitions(years, tmp_path / "downloads",
+                                   tmp_path / "partitions",
+                                   url_template=url_template)
+    assert list(partitions) == years
+    file_names = [tmp_path / "partitions" / partitions[year]["file"]
+                  for year in years]
+    columns = partitions[years[0]]["columns"]
+
+    n_rows = merge_sorted_partitions(file_names, tmp_path / "merged.csv",
+                                     columns, batch_size=batch_size)
+
+    expected = pd.concat([pd.read_parquet(file_name) for file_name in file_names])
+    expected = expected.sort_values("datetime", kind="stable")
+    assert n_rows == len(expected)
+    assert expected["datetime"].isna().sum() == 9
+    assert ((tmp_path / "merged.csv").read_text()
+            == expected.to_csv(index=False, date_format="%Y-%m-%d %H:%M:%S"))
+
+
+def test_update_partitions_unchanged(yearly_files, tmp_path):
+    years, url_template = yearly_files
+    partitions = update_partitions(years, tmp_path / "downloads",
+                                   tmp_path / "partitions",
+                                   url_template=url_template)
+    manifest = (tmp_path / "partitions" / "partitions.json").read_text()
+    modified = {year: (tmp_path / "partitions" / entry["file"]).stat().st_mtime_ns
+                for year, entry in partitions.items()}
+
+    # the downloaded files are unchanged, the partitions are kept as such
+    assert update_partitions(years, tmp_path / "downloads",
+                             tmp_path / "partitions",
+                             url_template=url_template) == partitions
+    assert (tmp_path / "partitions" / "partitions.json").read_text() == manifest
+    assert modified == {
+        year: (tmp_path / "partitions" / entry["file"]).stat().st_mtime_ns
+        for year, entry in partitions.items()}
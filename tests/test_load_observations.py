@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from load_observations import RowHashIndex
+
+
+def make_batch(start, n):
+    return pd.DataFrame({"species": [f"sp{i % 7}" for i in range(start, start + n)],
+                         "plot": np.arange(start, start + n) % 5})
+
+
+def test_row_hash_index_batch_of_only_duplicates(tmp_path):
+    batch = make_batch(0, 20)
+    index = RowHashIndex(tmp_path)
+    index.append(batch)
+    segment_files = sorted(path.name for path in tmp_path.glob("*.npy"))
+    # the second batch adds no new record and no (empty) segment
+    assert index.append(batch).all()
+    assert sorted(path.name for path in tmp_path.glob("*.npy")) == segment_files
+    assert index.meta["segments"] == segment_files
+    n_segments = len(index.meta["segments"])
+
+    third = make_batch(10, 40)
+    history = pd.concat([batch, batch])
+    expected = pd.concat([history, third]).duplicated().to_numpy()[len(history):]
+    np.testing.assert_array_equal(index.check(third), expected)
+
+    reloaded = RowHashIndex(tmp_path)
+    assert len(reloaded.meta["segments"]) == n_segments
+    np.testing.assert_array_equal(reloaded.append(third), expected)
+    np.testing.assert_array_equal(
+        reloaded.duplicated(),
+        pd.concat([history, third]).duplicated().to_numpy())
+
+
+
+def test_row_hash_index_no_empty_segments(tmp_path):
+    index = RowHashIndex(tmp_path)
+    batches = [make_batch(start, n) for start, n in
+               [(0, 20), (0, 20), (5, 10), (15, 30), (0, 45), (40, 3), (0, 43)]]
+    for batch in batches:
+        index.append(batch)
+        assert all(len(segment) for segment in index.segments)
+        assert all(len(np.load(path)) for path in tmp_path.glob("*.npy"))
+        assert len(index.segments) == len(list(tmp_path.glob("*.npy")))
+    np.testing.assert_array_equal(index.duplicated(),
+                                  pd.concat(batches).duplicated().to_numpy())